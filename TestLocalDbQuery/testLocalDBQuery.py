@@ -5,12 +5,15 @@ import logging
 
 import greengrasssdk
 
-import sqlite3
+import edgedb
 
 client = greengrasssdk.client('iot-data')
 
 OUTPUT_TOPIC = 'test/test/response'
-DB_PATH = '/home/pi/edge.db'
+DB_PATH = edgedb.DB_PATH
+
+db = edgedb.get_db(DB_PATH)
+db.register('device_name', 'SELECT deviceName FROM devices')
 
 def get_input_topic(context):
     try:
@@ -26,25 +29,20 @@ def get_input_message(event):
         logging.error('Message could not be parsed. ' + repr(e))
     return message
     
-def get_device_name(con):
-    cur = con.cursor()
-    cur.execute('SELECT deviceName FROM devices')
-    device_name = cur.fetchall()[0][0]
+def get_device_name(db):
+    device_name = db.fetchone('device_name')[0]
     return device_name
 
 def function_handler(event, context):
     try:
         input_topic = get_input_topic(context)
         
-        con = sqlite3.connect(DB_PATH)
-        device_name = get_device_name(con)
+        device_name = get_device_name(db)
         
         response = 'Invoked on topic "%s" with device name "%s"' % (input_topic, device_name)
         logging.info(response)
     except Exception as e:
         logging.error(e)
-    finally:
-        con.close()
 
     client.publish(topic=OUTPUT_TOPIC, payload=response)
 
@@ -0,0 +1,88 @@
+"""
+Micro-benchmark of StreamManagerClient's frame reader. Frames of 1 KB, 64 KB
+and 16 MB are served over a loopback socket and read with the readexactly()
+reader of the client, and with the reader it replaced, which grew a bytearray
+chunk by chunk and copied it to bytes.
+
+    python bench_frame_reader.py
+"""
+import asyncio
+import logging
+import time
+
+from greengrasssdk.stream_manager import StreamManagerClient
+from greengrasssdk.stream_manager.data import MessageFrame, Operation
+from greengrasssdk.stream_manager.utilinternal import UtilInternal
+
+# Payload size -> number of frames read per run
+FRAME_COUNTS = [
+    (1024, 20000),
+    (64 * 1024, 2000),
+    (16 * 1024 * 1024, 16),
+]
+RUNS = 3
+
+async def read_frame_chunked(reader):
+    # The reader as it was before readexactly(), except that the header is read with readexactly() too:
+    # read(n=4) may return part of a header split across socket reads, which the old reader misparsed
+    length = UtilInternal.int_from_bytes(await reader.readexactly(4))
+    operation = UtilInternal.int_from_bytes(await reader.readexactly(1))
+
+    payload = bytearray()
+    read_bytes = 1
+    while read_bytes < length:
+        next_payload = await reader.read(n=length - read_bytes)
+        if len(next_payload) == 0:
+            raise asyncio.IncompleteReadError(next_payload, length - read_bytes)
+        payload.extend(next_payload)
+        read_bytes += len(next_payload)
+
+    return MessageFrame(operation=Operation.from_dict(operation), payload=bytes(payload))
+
+def client_frame_reader(reader):
+    # The client's own reader, run against the benchmark's socket
+    client = StreamManagerClient.__new__(StreamManagerClient)
+    client.logger = logging.getLogger('bench')
+    client._StreamManagerClient__reader = reader
+    return client._StreamManagerClient__read_message_frame
+
+async def time_reads(read_frame, size, count):
+    frame = b''.join([
+        UtilInternal.int_to_bytes(size + 1),
+        UtilInternal.int_to_bytes(Operation.ReadMessagesResponse.value, length=1),
+        b'\0' * size,
+    ])
+
+    async def serve(reader, writer):
+        for _ in range(count):
+            writer.write(frame)
+            await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(serve, '127.0.0.1', 0)
+    reader, writer = await asyncio.open_connection('127.0.0.1', server.sockets[0].getsockname()[1])
+    read = read_frame(reader)
+    start = time.perf_counter()
+    for _ in range(count):
+        response = await read()
+        assert len(response.payload) == size
+    elapsed = time.perf_counter() - start
+    writer.close()
+    server.close()
+    await server.wait_closed()
+    return elapsed
+
+async def main():
+    readers = [
+        ('read() + bytearray', lambda reader: lambda: read_frame_chunked(reader)),
+        ('readexactly()', client_frame_reader),
+    ]
+    print('%-10s %-20s %12s %10s' % ('frame', 'reader', 'us/frame', 'MB/s'))
+    for size, count in FRAME_COUNTS:
+        for name, read_frame in readers:
+            elapsed = min([await time_reads(read_frame, size, count) for _ in range(RUNS)])
+            print('%-10s %-20s %12.1f %10.0f' % (
+                '%d KB' % (size // 1024), name, elapsed / count * 1e6, size * count / elapsed / 1e6))
+
+if __name__ == '__main__':
+    asyncio.run(main())
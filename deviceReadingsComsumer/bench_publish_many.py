@@ -0,0 +1,103 @@
+"""
+Benchmark of IoTDataPlane.Client.publish_many against a loop of publish()
+calls, for a batch of small messages to one topic. IPCClient.post_work is
+replaced by a call which sleeps POST_LATENCY seconds, standing in for the
+round trip to Greengrass Core, so the benchmark also runs off a core device.
+
+    python bench_publish_many.py
+"""
+import logging
+import sys
+import time
+import types
+
+MESSAGES = 1000
+POST_LATENCY = 0.0002
+IN_FLIGHT = [1, 4, 8]
+RUNS = 3
+
+def install_core_stand_ins():
+    # The Greengrass Core modules the SDK imports are only installed on a core device
+    try:
+        import greengrass_common.env_vars  # noqa: F401
+        import greengrass_ipc_python_sdk.ipc_client  # noqa: F401
+        return
+    except ImportError:
+        pass
+
+    class FunctionArnFields:
+        def __init__(self, arn):
+            parts = arn.split(':')
+            self.qualifier = parts[7] if len(parts) > 7 else ''
+            self.unqualified_arn = ':'.join(parts[:7])
+
+        @staticmethod
+        def build_function_arn(unqualified_arn, qualifier=None):
+            return unqualified_arn + (':' + qualifier if qualifier else '')
+
+    class IPCException(Exception):
+        pass
+
+    class IPCClient:
+        def __init__(self, endpoint='localhost'):
+            pass
+
+    modules = {
+        'greengrass_common': {},
+        'greengrass_common.env_vars': {
+            'SHADOW_FUNCTION_ARN': 'arn:aws:lambda:us-east-1:123456789012:function:GGShadowService',
+            'ROUTER_FUNCTION_ARN': 'arn:aws:lambda:us-east-1:123456789012:function:GGRouter',
+            'MY_FUNCTION_ARN': None,
+            'SECRETS_MANAGER_FUNCTION_ARN': 'arn:aws:lambda:us-east-1:123456789012:function:GGSecretManager',
+        },
+        'greengrass_common.function_arn_fields': {'FunctionArnFields': FunctionArnFields},
+        'greengrass_ipc_python_sdk': {},
+        'greengrass_ipc_python_sdk.ipc_client': {'IPCClient': IPCClient, 'IPCException': IPCException},
+    }
+    for name, attributes in modules.items():
+        module = types.ModuleType(name)
+        module.__dict__.update(attributes)
+        sys.modules[name] = module
+
+install_core_stand_ins()
+
+import greengrasssdk  # noqa: E402
+import greengrasssdk.utils.testing  # noqa: E402
+from greengrass_ipc_python_sdk.ipc_client import IPCClient  # noqa: E402
+
+def post_work(self, function_arn, input_bytes, client_context, invocation_type='RequestResponse'):
+    time.sleep(POST_LATENCY)
+    return 'invocation-id'
+
+def time_publish(client, payloads):
+    start = time.perf_counter()
+    for payload in payloads:
+        client.publish(topic='bench/readings', payload=payload)
+    return time.perf_counter() - start
+
+def time_publish_many(client, payloads):
+    start = time.perf_counter()
+    results = client.publish_many('bench/readings', payloads)
+    elapsed = time.perf_counter() - start
+    assert results == [None] * len(payloads)
+    return elapsed
+
+def main():
+    # Post every message through IPCClient rather than the SDK's mock, with the simulated latency
+    greengrasssdk.utils.testing.MY_FUNCTION_ARN = 'arn:aws:lambda:us-east-1:123456789012:function:bench:1'
+    IPCClient.post_work = post_work
+    logging.disable(logging.CRITICAL)
+
+    payloads = [('{"deviceName": "bin-%d", "capacity": 42}' % i).encode('utf-8') for i in range(MESSAGES)]
+    print('%-28s %10s %12s' % ('publishing', 'ms', 'messages/s'))
+
+    client = greengrasssdk.client('iot-data')
+    elapsed = min(time_publish(client, payloads) for _ in range(RUNS))
+    print('%-28s %10.1f %12.0f' % ('publish() loop', elapsed * 1e3, MESSAGES / elapsed))
+    for in_flight in IN_FLIGHT:
+        client = greengrasssdk.client('iot-data', publish_many_in_flight=in_flight)
+        elapsed = min(time_publish_many(client, payloads) for _ in range(RUNS))
+        print('%-28s %10.1f %12.0f' % ('publish_many, %d in flight' % in_flight, elapsed * 1e3, MESSAGES / elapsed))
+
+if __name__ == '__main__':
+    main()
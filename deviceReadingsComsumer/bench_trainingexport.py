@@ -0,0 +1,99 @@
+"""
+Benchmark of trainingexport on a synthetic edge database of 10M readings from
+2000 devices, with timestamps in epoch seconds and epoch milliseconds. The
+exporter, in-process and with a pool of worker processes, is compared with
+exporting the way it was done offline: every reading grouped in memory, then
+one series per device. Each export runs in a process of its own so that its
+peak memory is measured alone.
+
+    python bench_trainingexport.py [readings] [devices]
+"""
+import gzip
+import json
+import os
+import resource
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import trainingexport
+
+READINGS = 10000000
+DEVICES = 2000
+START = 1612000000
+# Seconds between two readings of a device
+INTERVAL = 600
+
+def create_db(path, readings, devices):
+    con = sqlite3.connect(path)
+    con.execute('CREATE TABLE readings (deviceName TEXT, timestamp TEXT, capacity REAL)')
+    per_device = readings // devices
+    con.executemany('INSERT INTO readings VALUES (?, ?, ?)', (
+        ('bin-%05d' % d, str(START + i * INTERVAL + d) if d % 2 else str((START + i * INTERVAL) * 1000), (i * 7 + d) % 100)
+        for d in range(devices) for i in range(per_device)
+    ))
+    con.commit()
+    con.close()
+
+def export_in_memory(db_path, out_path):
+    # Every reading grouped per device in memory, then written as a single shard
+    step = trainingexport.freq_seconds(trainingexport.TRAINING_FREQ)
+    devices = {}
+    con = sqlite3.connect(db_path)
+    for device_name, timestamp, capacity in con.execute(trainingexport.READINGS_QUERY):
+        devices.setdefault(device_name, []).append((trainingexport.parse_timestamp(timestamp), float(capacity)))
+    con.close()
+    os.makedirs(out_path, exist_ok=True)
+    with gzip.open(os.path.join(out_path, 'train.jsonl.gz'), 'wt', compresslevel=6) as f:
+        for device_name in sorted(devices):
+            series, _ = trainingexport.build_series(devices[device_name], step)
+            f.write(json.dumps(series, separators=(',', ':')))
+            f.write('\n')
+    return len(devices)
+
+def run(variant, db_path, out_path):
+    start = time.perf_counter()
+    if variant == 'in memory':
+        series = export_in_memory(db_path, out_path)
+    else:
+        workers = int(variant.split()[-1])
+        series = trainingexport.export_training_data(trainingexport.iter_db_readings(db_path), out_path, workers=workers)['series']
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        'elapsed': elapsed,
+        'series': series,
+        'rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024,
+        'worker_rss': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // 1024,
+    }))
+
+def main():
+    readings = int(sys.argv[1]) if len(sys.argv) > 1 else READINGS
+    devices = int(sys.argv[2]) if len(sys.argv) > 2 else DEVICES
+    variants = ['in memory', 'exporter, workers 1', 'exporter, workers %d' % max(2, os.cpu_count() or 1)]
+
+    path = tempfile.mkdtemp(prefix='bench-trainingexport-')
+    try:
+        db_path = os.path.join(path, 'edge.db')
+        create_db(db_path, readings, devices)
+        print('%d readings, %d devices, %d CPU(s)' % (readings // devices * devices, devices, os.cpu_count() or 1))
+        print('%-22s %8s %12s %14s %16s' % ('export', 's', 'readings/s', 'peak RSS MiB', 'worker RSS MiB'))
+        for variant in variants:
+            out_path = os.path.join(path, 'out')
+            output = subprocess.check_output([sys.executable, __file__, '--run', variant, db_path, out_path])
+            result = json.loads(output)
+            shutil.rmtree(out_path)
+            assert result['series'] == devices
+            print('%-22s %8.1f %12.0f %14d %16s' % (
+                variant, result['elapsed'], readings // devices * devices / result['elapsed'], result['rss'],
+                result['worker_rss'] or '-'))
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--run']:
+        run(*sys.argv[2:5])
+    else:
+        main()
@@ -0,0 +1,142 @@
+"""
+Micro-benchmark of stream_manager request validation. UtilInternal.is_invalid,
+which runs a validator generated once per data class, is compared with the
+generic walk over _validations_map and _types_map it replaced, on the
+AppendMessageRequest of every append and on a MessageStreamDefinition with a
+Kinesis export. Both must return the same result.
+
+    python bench_validation.py
+"""
+import re
+import timeit
+
+from greengrasssdk.stream_manager.data import (
+    AppendMessageRequest,
+    ExportDefinition,
+    KinesisConfig,
+    MessageStreamDefinition,
+    Persistence,
+    StrategyOnFull,
+)
+from greengrasssdk.stream_manager.utilinternal import UtilInternal
+
+CALLS = 100000
+
+def is_invalid_walk(o):
+    # The validation as it was before the generated validators
+    if not hasattr(o, "_validations_map"):
+        return False
+    if not hasattr(o, "_types_map"):
+        return False
+    for prop_name, validations in o._validations_map.items():
+        if not hasattr(o, prop_name):
+            return "Object is malformed, missing property: {}".format(prop_name)
+        # Validate all properties on lists
+        if type(getattr(o, prop_name)) == list:
+            for i, v in enumerate(getattr(o, prop_name)):
+                result = is_invalid_walk(v)
+                if result:
+                    return "Property {}[{}] is invalid because {}".format(prop_name, i, result)
+
+        # Recurse down to check validity of objects within objects
+        result = is_invalid_walk(getattr(o, prop_name))
+        if result:
+            return "Property {} is invalid because {}".format(prop_name, result)
+
+        # Validate the property
+        if "required" in validations and validations["required"] and getattr(o, prop_name) is None:
+            return "Property {} is required, but was None".format(prop_name)
+        if (
+            "minLength" in validations
+            and getattr(o, prop_name) is not None
+            and len(getattr(o, prop_name)) < validations["minLength"]
+        ):
+            return "Property {} must have a minimum length of {}, but found length of {}".format(
+                prop_name, validations["minLength"], len(getattr(o, prop_name))
+            )
+        if (
+            "maxLength" in validations
+            and getattr(o, prop_name) is not None
+            and len(getattr(o, prop_name)) > validations["maxLength"]
+        ):
+            return "Property {} must have a maximum length of {}, but found length of {}".format(
+                prop_name, validations["maxLength"], len(getattr(o, prop_name))
+            )
+        if (
+            "minItems" in validations
+            and getattr(o, prop_name) is not None
+            and len(getattr(o, prop_name)) < validations["minItems"]
+        ):
+            return "Property {} must have at least {} items, but found {}".format(
+                prop_name, validations["minItems"], len(getattr(o, prop_name))
+            )
+        if (
+            "maxItems" in validations
+            and getattr(o, prop_name) is not None
+            and len(getattr(o, prop_name)) > validations["maxItems"]
+        ):
+            return "Property {} must have at most {} items, but found {}".format(
+                prop_name, validations["maxItems"], len(getattr(o, prop_name))
+            )
+        if (
+            "maximum" in validations
+            and getattr(o, prop_name) is not None
+            and getattr(o, prop_name) > validations["maximum"]
+        ):
+            return "Property {} must be at most {}".format(prop_name, validations["maximum"])
+        if (
+            "minimum" in validations
+            and getattr(o, prop_name) is not None
+            and getattr(o, prop_name) < validations["minimum"]
+        ):
+            return "Property {} must be at least {}".format(prop_name, validations["minimum"])
+        if (
+            "pattern" in validations
+            and getattr(o, prop_name) is not None
+            and re.fullmatch(validations["pattern"], getattr(o, prop_name)) is None
+        ):
+            return "Property {} must match regex {}".format(prop_name, validations["pattern"])
+
+    for prop_name, types in o._types_map.items():
+        # Validate all properties with their respective types
+        if "type" in types and getattr(o, prop_name) is not None:
+            result = isinstance(getattr(o, prop_name), types["type"])
+            if not result:
+                return "Property {} is invalid because it must be of type {}".format(
+                    prop_name, types["type"].__name__
+                )
+            if types["type"] == list and "subtype" in types:
+                for i, v in enumerate(getattr(o, prop_name)):
+                    result = isinstance(v, types["subtype"])
+                    if not result:
+                        return "Property {}[{}] is invalid because it must be of type {}".format(
+                            prop_name, i, types["subtype"].__name__
+                        )
+
+    return False
+
+def main():
+    append = AppendMessageRequest(
+        request_id='e6e3c5c5-6a0b-4d4a-9c3d-2f3c1b8f6a55', name='DeviceReadings', payload=b'\0' * 1024
+    )
+    definition = MessageStreamDefinition(
+        name='DeviceReadings',
+        max_size=256 * 1024 * 1024,
+        stream_segment_size=16 * 1024 * 1024,
+        strategy_on_full=StrategyOnFull.OverwriteOldestData,
+        persistence=Persistence.File,
+        export_definition=ExportDefinition(
+            kinesis=[KinesisConfig(identifier='KinesisExport', kinesis_stream_name='device-readings', batch_size=500)]
+        ),
+    )
+    invalid = AppendMessageRequest(request_id='e6e3c5c5', name='Device/Readings', payload=b'')
+
+    print('%-26s %14s %14s' % ('request', 'walk (us)', 'generated (us)'))
+    for name, o in [('AppendMessageRequest', append), ('MessageStreamDefinition', definition), ('invalid append', invalid)]:
+        assert UtilInternal.is_invalid(o) == is_invalid_walk(o)
+        walk = min(timeit.repeat(lambda: is_invalid_walk(o), number=CALLS, repeat=3))
+        generated = min(timeit.repeat(lambda: UtilInternal.is_invalid(o), number=CALLS, repeat=3))
+        print('%-26s %14.2f %14.2f' % (name, walk / CALLS * 1e6, generated / CALLS * 1e6))
+
+if __name__ == '__main__':
+    main()
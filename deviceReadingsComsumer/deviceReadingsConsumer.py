@@ -1,87 +1,229 @@
 import os
 import sys
 import json
+import time
 import logging
-import requests
+import threading
 import greengrasssdk
 
-import sqlite3
+import edgedb
+import httpsessions
+from readingbatcher import ReadingBatcher
+from readingstream import ReadingStream
+from collections import OrderedDict, namedtuple
 
 client = greengrasssdk.client('iot-data')
 
 OUTPUT_TOPIC = 'device/readings/put/response'
-DB_PATH = '/home/pi/edge.db'
-
-def get_device_id(con, device_name):
-    cur = con.cursor()
-    cur.execute('SELECT deviceID FROM devices WHERE deviceName=?', (device_name,))
-    device_id = cur.fetchall()[0][0]
-    return device_id
-
-def get_device_type(con, device_id):
-    cur = con.cursor()
-    cur.execute('SELECT deviceType FROM devices WHERE deviceID=?',(device_id,))
-    device_type = cur.fetchall()[0][0]
-    return device_type
-
-def get_application_id(con, device_id):
-    cur = con.cursor()
-    cur.execute('SELECT applicationID FROM registrations WHERE deviceID=?', (device_id,))
-    application_id = cur.fetchall()[0][0]
-    return application_id
-
-def get_application_endpoint(con, application_id):
-    cur = con.cursor()
-    cur.execute('SELECT applicationEndpoint FROM applications WHERE applicationID=?', (application_id,))
-    application_endpoint = cur.fetchall()[0][0]
-    return application_endpoint
-    
-def get_application_port(con, application_id):
-    cur = con.cursor()
-    cur.execute('SELECT applicationPort FROM applications WHERE applicationID=?', (application_id,))
-    application_port = cur.fetchall()[0][0]
-    return application_port
-
-def get_application_name(con, application_id):
-    cur = con.cursor()
-    cur.execute('SELECT applicationName FROM applications WHERE applicationID=?', (application_id,))
-    application_name = cur.fetchall()[0][0]
-    return application_name   
+DB_PATH = edgedb.DB_PATH
 
+# When enabled, readings are buffered per application and forwarded as one bulk POST
+BATCH_MODE = os.environ.get('BATCH_MODE', 'false').lower() == 'true'
+BATCH_PATH = os.environ.get('BATCH_PATH', '/devices')
+
+# When enabled, readings are appended to a local StreamManager stream and forwarded by a drain thread
+STREAM_MODE = os.environ.get('STREAM_MODE', 'false').lower() == 'true'
+
+ROUTE_CACHE_SIZE = int(os.environ.get('ROUTE_CACHE_SIZE', 1024))
+ROUTE_CACHE_TTL = int(os.environ.get('ROUTE_CACHE_TTL', 300))
+
+ROUTE_QUERY = '''
+    SELECT d.deviceType, a.applicationName, a.applicationEndpoint, a.applicationPort
+    FROM devices d
+    JOIN registrations r ON r.deviceID = d.deviceID
+    JOIN applications a ON a.applicationID = r.applicationID
+    WHERE d.deviceName = ?
+    LIMIT 1
+'''
+
+DeviceRoute = namedtuple('DeviceRoute', [
+    'device_type',
+    'application_name',
+    'application_endpoint',
+    'application_port',
+])
+
+class RouteCache:
+    """
+    Size-bounded LRU cache of device routes with a per-entry TTL. Lives at module
+    level so it survives across warm invocations of the Greengrass container.
+    """
+    def __init__(self, max_size=ROUTE_CACHE_SIZE, ttl=ROUTE_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, device_name):
+        with self._lock:
+            entry = self._entries.get(device_name)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[device_name]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(device_name)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, device_name, route):
+        with self._lock:
+            self._entries[device_name] = (time.monotonic() + self.ttl, route)
+            self._entries.move_to_end(device_name)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, device_name=None):
+        with self._lock:
+            if device_name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(device_name, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': self.hits / lookups if lookups else 0.0,
+                'missRate': self.misses / lookups if lookups else 0.0,
+            }
+
+route_cache = RouteCache()
+
+db = edgedb.get_db(DB_PATH)
+db.register('device_route', ROUTE_QUERY)
+
+def get_device_route(db, device_name):
+    row = db.fetchone('device_route', (device_name,))
+    if row is None:
+        raise LookupError('Device "%s" is not registered to any application' % device_name)
+    return DeviceRoute(*row)
+
+def resolve_device_route(db, device_name):
+    route = route_cache.get(device_name)
+    if route is None:
+        route = get_device_route(db, device_name)
+        route_cache.put(device_name, route)
+    return route
+
+def get_application_url_prefix(route):
+    return 'http://' + route.application_endpoint + ':' + str(route.application_port)
+
+def build_http_request(event, route):
+    return {
+        'applicationName': route.application_name,
+        'edgeName': 'Toronto-Region-1',
+        'deviceName': event['deviceName'], 
+        'deviceIP': event['deviceIP'],
+        'deviceType': route.device_type,
+        'capacity': event['capacity'],
+        'longitude': event['longitude'],
+        'latitude': event['latitude'],
+        'timestamp': event['timestamp'],
+    }
+
+def get_batch_statuses(r, count):
+    """
+    Per-reading statuses for a bulk POST. The application may answer with a JSON
+    array holding one {'status': ...} entry per reading, in request order; any
+    other successful answer applies to the whole batch.
+    """
+    if r.status_code not in (200, 207):
+        return ['error when sending readings to the application'] * count
+    try:
+        body = r.json()
+    except ValueError:
+        body = None
+    if isinstance(body, list) and len(body) == count:
+        return [
+            item.get('status', 'successs') if isinstance(item, dict) else 'successs'
+            for item in body
+        ]
+    return ['successs'] * count
+
+def forward_batch(application, readings):
+    """
+    POST readings to the application and publish their statuses. Returns whether
+    the application received the batch, regardless of how it judged each reading.
+    """
+    application_name, application_url_prefix = application
+    try:
+        r = httpsessions.sessions.post(application_url_prefix + BATCH_PATH, json=readings)
+        statuses = get_batch_statuses(r, len(readings))
+        delivered = r.status_code in (200, 207)
+    except Exception as e:
+        logging.error(e)
+        statuses = [repr(e)] * len(readings)
+        delivered = False
+
+    results = [
+        {
+            'deviceName': reading['deviceName'],
+            'timestamp': reading['timestamp'],
+            'status': status,
+        }
+        for reading, status in zip(readings, statuses)
+    ]
+    failed = sum(1 for result in results if result['status'] != 'successs')
+    response = {
+        'status': 'successs' if not failed else 'error when sending %d of %d readings to the application' % (failed, len(results)),
+        'applicationName': application_name,
+        'results': results,
+    }
+    logging.info(response)
+
+    client.publish(topic=OUTPUT_TOPIC, payload=json.dumps(response))
+
+    return delivered
+
+def route_stream_reading(event):
+    """
+    Route a reading drained from the stream to its application, which gets the
+    readings of a batch in one bulk POST through forward_batch. Readings of
+    devices that cannot be routed, or missing a field, are reported and dropped.
+    """
+    try:
+        route = resolve_device_route(db, event['deviceName'])
+        http_request = build_http_request(event, route)
+    except Exception as e:
+        logging.error(e)
+        client.publish(topic=OUTPUT_TOPIC, payload=json.dumps({'status': repr(e)}))
+        return None
+    return (route.application_name, get_application_url_prefix(route)), http_request
+
+batcher = ReadingBatcher(forward_batch)
+reading_stream = ReadingStream()
+
+# Publishes are queued and handed to Greengrass Core in the background, and flushed before the handler returns
+@client.flush_on_return
 def function_handler(event, context):
     response = {
         'status': 'unsuccessful'
     }
     try:        
-        con = sqlite3.connect(DB_PATH)
-        
-        device_id = get_device_id(con, event['deviceName'])
-        application_id = get_application_id(con, device_id)
-        application_endpoint = get_application_endpoint(con, application_id)
-        application_port = get_application_port(con, application_id)
-        application_name = get_application_name(con, application_id)
-        device_type = get_device_type(con, device_id)
-
-        http_request = {
-            'applicationName': application_name,
-            'edgeName': 'Toronto-Region-1',
-            'deviceName': event['deviceName'], 
-            'deviceIP': event['deviceIP'],
-            'deviceType': device_type,
-            'capacity': event['capacity'],
-            'longitude': event['longitude'],
-            'latitude': event['latitude'],
-            'timestamp': event['timestamp'],
-        }
-        
-        
-        
-        client.publish(topic=OUTPUT_TOPIC, payload=json.dumps(http_request))
+        if STREAM_MODE:
+            reading_stream.start_drain(route_stream_reading, forward_batch)
+            reading_stream.append(event)
+            return
+
+        route = resolve_device_route(db, event['deviceName'])
+        http_request = build_http_request(event, route)
+        application_url_prefix = get_application_url_prefix(route)
+
+        if BATCH_MODE:
+            batcher.add((route.application_name, application_url_prefix), http_request)
+            return
+
+        client.publish_async(topic=OUTPUT_TOPIC, payload=json.dumps(http_request))
         
-        application_url_prefix = 'http://' + application_endpoint + ':' + str(application_port)
         application_url  = application_url_prefix + '/devices'
         # r = requests.get(application_url, data = http_request)
-        r = requests.get(application_url)
+        r = httpsessions.sessions.get(application_url)
         
         if r.status_code != 200:
             response['status'] = 'error when sending readings to the application'
@@ -90,12 +232,13 @@ def function_handler(event, context):
             response['devices'] = r.json()
             
         logging.info(response)
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug('Route cache stats: %s', route_cache.stats())
+            logging.debug('HTTP session stats: %s', httpsessions.sessions.stats())
     except Exception as e:
         logging.error(e)
         response['status'] = repr(e)
-    finally:
-        con.close()
 
-    client.publish(topic=OUTPUT_TOPIC, payload=json.dumps(response))
+    client.publish_async(topic=OUTPUT_TOPIC, payload=json.dumps(response))
 
     return
\ No newline at end of file
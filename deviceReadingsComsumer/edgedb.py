@@ -0,0 +1,127 @@
+import os
+import logging
+import sqlite3
+import threading
+
+DB_PATH = '/home/pi/edge.db'
+
+# Page cache size in KiB (negative values are interpreted by SQLite as KiB) and mmap window in bytes
+CACHE_SIZE_KIB = int(os.environ.get('EDGE_DB_CACHE_SIZE_KIB', 8192))
+MMAP_SIZE = int(os.environ.get('EDGE_DB_MMAP_SIZE', 64 * 1024 * 1024))
+BUSY_TIMEOUT_MS = int(os.environ.get('EDGE_DB_BUSY_TIMEOUT_MS', 5000))
+# The journal mode is stored in the database file and so applies to every function that opens it.
+# It is left as it is unless set here, e.g. to WAL once every reader of the file supports it
+JOURNAL_MODE = os.environ.get('EDGE_DB_JOURNAL_MODE', '')
+
+# Upper bound of compiled statements sqlite3 keeps per connection
+CACHED_STATEMENTS = 256
+
+class EdgeDB:
+    """
+    Long-lived connection to the edge database, shared by every invocation served
+    by the same Greengrass container. The connection is opened lazily, tuned once,
+    and reopened only when the database file on disk is replaced.
+
+    Hot read statements are registered by name. sqlite3 compiles statements on
+    first use and keeps them in a per-connection cache keyed by SQL text, so
+    registered statements are compiled right after connecting, before the first
+    real lookup.
+
+    The connection is shared by the handler and background threads, so every
+    statement is executed and its rows fetched while holding the lock.
+    """
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self.statements = {}
+        self.connects = 0
+        self._con = None
+        self._file_id = None
+        self._lock = threading.RLock()
+
+    def register(self, name, sql):
+        with self._lock:
+            self.statements[name] = sql
+            if self._con is not None:
+                self._prepare(self._con, sql)
+
+    def connection(self):
+        """Return the connection, reconnecting if needed. Use it while holding the lock only."""
+        with self._lock:
+            file_id = self._stat()
+            if self._con is not None and file_id != self._file_id:
+                logging.info('Database file %s was replaced, reconnecting', self.path)
+                self._close()
+            if self._con is None:
+                self._con = self._connect()
+                self._file_id = file_id
+            return self._con
+
+    def fetchone(self, name, params=()):
+        with self._lock:
+            cur = self.connection().execute(self.statements[name], params)
+            try:
+                return cur.fetchone()
+            finally:
+                cur.close()
+
+    def fetchall(self, name, params=()):
+        with self._lock:
+            cur = self.connection().execute(self.statements[name], params)
+            try:
+                return cur.fetchall()
+            finally:
+                cur.close()
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _stat(self):
+        st = os.stat(self.path)
+        return (st.st_dev, st.st_ino)
+
+    def _connect(self):
+        con = sqlite3.connect(
+            self.path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+            cached_statements=CACHED_STATEMENTS,
+        )
+        if JOURNAL_MODE:
+            con.execute('PRAGMA journal_mode=%s' % JOURNAL_MODE)
+        con.execute('PRAGMA synchronous=NORMAL')
+        con.execute('PRAGMA cache_size=-%d' % CACHE_SIZE_KIB)
+        con.execute('PRAGMA mmap_size=%d' % MMAP_SIZE)
+        con.execute('PRAGMA temp_store=MEMORY')
+        for sql in self.statements.values():
+            self._prepare(con, sql)
+        self.connects += 1
+        return con
+
+    def _prepare(self, con, sql):
+        # sqlite3 compiles and caches the statement before binding parameters, so executing it
+        # without any is enough. A statement that takes parameters then fails to bind, which is expected
+        try:
+            con.execute(sql).close()
+        except sqlite3.ProgrammingError:
+            pass
+
+    def _close(self):
+        if self._con is not None:
+            try:
+                self._con.close()
+            except sqlite3.Error as e:
+                logging.error(e)
+        self._con = None
+        self._file_id = None
+
+_databases = {}
+_databases_lock = threading.Lock()
+
+def get_db(path=DB_PATH):
+    """Return the process-wide EdgeDB for path, creating it on first use."""
+    with _databases_lock:
+        db = _databases.get(path)
+        if db is None:
+            db = _databases[path] = EdgeDB(path)
+        return db
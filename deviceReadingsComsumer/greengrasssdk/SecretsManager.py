@@ -5,6 +5,9 @@
 from __future__ import division
 import json
 import logging
+import threading
+import time
+from concurrent.futures import Future
 from datetime import datetime
 
 from greengrasssdk import Lambda
@@ -26,13 +29,119 @@ KEY_NAME_VERSION_STAGE = 'VersionStage'
 KEY_NAME_CREATED_DATE = "CreatedDate"
 
 
+# Share of the TTL before expiry at which a cached secret is refreshed in the background, if not set explicitly
+SECRET_REFRESH_AHEAD_RATIO = 0.2
+
+
 class SecretsManagerError(Exception):
     pass
 
 
+class SecretCache:
+    """
+    Cache of secret values keyed by (SecretId, VersionStage), with a TTL.
+
+    Once an entry is within refresh_ahead seconds of expiring, the next lookup still returns it but also starts
+    fetching a fresh value in the background, so a secret read regularly never expires in front of a caller.
+    Concurrent lookups of a missing secret wait for a single fetch instead of each fetching it. Values fetched
+    while the cache was invalidated are returned to their callers but not cached.
+    """
+    def __init__(self, fetch, ttl, refresh_ahead):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self._entries = {}
+        self._in_flight = {}
+        self._invalidations = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now < entry[0]:
+                self.hits += 1
+                if now >= entry[0] - self.refresh_ahead and key not in self._in_flight:
+                    self.refreshes += 1
+                    future = self._in_flight[key] = Future()
+                    threading.Thread(target=self._load, args=(key, future, True), daemon=True).start()
+                return entry[1]
+
+            self.misses += 1
+            future = self._in_flight.get(key)
+            loader = future is None
+            if loader:
+                future = self._in_flight[key] = Future()
+
+        if loader:
+            self._load(key, future, False)
+        return future.result()
+
+    def invalidate(self, secret_id=None, version_stage=None):
+        """
+        Drop every cached secret, every version stage of secret_id, or a single (secret_id, version_stage).
+        """
+        with self._lock:
+            for key in list(self._entries):
+                if secret_id is not None and key[0] != secret_id:
+                    continue
+                if version_stage is not None and key[1] != version_stage:
+                    continue
+                del self._entries[key]
+            self._invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'refreshes': self.refreshes,
+                'hitRate': self.hits / lookups if lookups else 0.0,
+                'missRate': self.misses / lookups if lookups else 0.0,
+            }
+
+    def _load(self, key, future, background):
+        invalidations = self._invalidations
+        try:
+            value = self.fetch(*key)
+        except Exception as e:
+            if background:
+                customer_logger.exception(e)
+            with self._lock:
+                self._in_flight.pop(key, None)
+            future.set_exception(e)
+            return
+
+        with self._lock:
+            self._in_flight.pop(key, None)
+            if invalidations == self._invalidations:
+                self._entries[key] = (time.monotonic() + self.ttl, value)
+        future.set_result(value)
+
+
 class Client:
-    def __init__(self):
+    def __init__(self, secret_cache_ttl=0, secret_refresh_ahead=None):
+        """
+        :param secret_cache_ttl: Seconds for which get_secret_value serves a secret from memory.
+            The cache is disabled if 0.
+        :type secret_cache_ttl: float
+
+        :param secret_refresh_ahead: Seconds before a cached secret expires from which it is refreshed in the
+            background. Defaults to a fifth of secret_cache_ttl.
+        :type secret_refresh_ahead: float
+        """
         self.lambda_client = Lambda.Client()
+        if secret_cache_ttl > 0:
+            if secret_refresh_ahead is None:
+                secret_refresh_ahead = secret_cache_ttl * SECRET_REFRESH_AHEAD_RATIO
+            self.secret_cache = SecretCache(self._fetch_secret_value, secret_cache_ttl, secret_refresh_ahead)
+        else:
+            self.secret_cache = None
 
     def get_secret_value(self, **kwargs):
         r"""
@@ -104,12 +213,33 @@ class Client:
         if version_id and version_stage:
             raise ValueError('VersionId and VersionStage cannot both be specified at the same time')
 
+        if self.secret_cache is None:
+            return self._fetch_secret_value(secret_id, version_stage)
+
+        # The cached dict is shared, so callers get their own copy
+        return dict(self.secret_cache.get((secret_id, version_stage)))
+
+    def invalidate_secret(self, **kwargs):
+        r"""
+        Drop cached secret values, so that the next get_secret_value call fetches them again.
+        Does nothing if the secret cache is disabled.
+
+        :Keyword Arguments:
+            * *SecretId* (``string``) --
+              The secret to drop. Every secret is dropped if not given.
+            * *VersionStage* (``string``) --
+              The staging label to drop. Every staging label of the secret is dropped if not given.
+        """
+        if self.secret_cache is not None:
+            self.secret_cache.invalidate(kwargs.get(KEY_NAME_SECRET_ID), kwargs.get(KEY_NAME_VERSION_STAGE))
+
+    def _fetch_secret_value(self, secret_id, version_stage, version_id=''):
         request_payload_bytes = self._generate_request_payload_bytes(secret_id=secret_id,
                                                                      version_id=version_id,
                                                                      version_stage=version_stage)
 
-        customer_logger.debug('Retrieving secret value with id "{}", version id "{}"  version stage "{}"'
-                              .format(secret_id, version_id, version_stage))
+        customer_logger.debug('Retrieving secret value with id "%s", version id "%s"  version stage "%s"',
+                              secret_id, version_id, version_stage)
         response = self.lambda_client._invoke_internal(
             SECRETS_MANAGER_FUNCTION_ARN,
             request_payload_bytes,
@@ -0,0 +1,148 @@
+import cbor2
+
+from .data import (
+    AppendMessageRequest,
+    AppendMessageResponse,
+    Message,
+    ReadMessagesResponse,
+    ResponseStatusCode,
+)
+from .exceptions import RequestPayloadTooLargeException
+from .utilinternal import UtilInternal
+
+
+def _cbor_head(major_type, length):
+    if length < 24:
+        return bytes([major_type << 5 | length])
+    if length < 1 << 8:
+        return bytes([major_type << 5 | 24, length])
+    if length < 1 << 16:
+        return bytes([major_type << 5 | 25]) + length.to_bytes(2, "big")
+    if length < 1 << 32:
+        return bytes([major_type << 5 | 26]) + length.to_bytes(4, "big")
+    return bytes([major_type << 5 | 27]) + length.to_bytes(8, "big")
+
+
+def _cbor_text(s):
+    b = s.encode("utf-8")
+    return _cbor_head(3, len(b)) + b
+
+
+class Codec:
+    """
+    Internal Only.
+
+    CBOR encoding of requests and decoding of responses for the client's hot paths.
+    AppendMessageRequest is encoded straight to CBOR, without an as_dict() tree, and a large payload is
+    handed to the socket as its own chunk instead of being copied into the frame. AppendMessageResponse,
+    ReadMessagesResponse and their Message objects are built directly from the decoded CBOR map, skipping
+    from_dict()'s per-field hasattr() checks and keyword arguments. Every other type goes through
+    as_dict()/from_dict() as before, and the bytes on the wire are the same either way.
+    Payloads stay bytes, as users rely on them supporting bytes methods such as decode().
+    """
+
+    # Chunks up to this size are joined to the frame header and written at once, larger ones are written as is
+    __COALESCE_LIMIT = 64 * 1024
+
+    # Map keys are constant, so their encodings are computed once
+    __APPEND_MESSAGE_REQUEST_HEAD = (
+        _cbor_head(5, 3),
+        _cbor_text("requestId"),
+        _cbor_text("name"),
+        _cbor_text("payload"),
+    )
+
+    @staticmethod
+    def __encode_append_message_request(data: AppendMessageRequest):
+        map_head, request_id_key, name_key, payload_key = Codec.__APPEND_MESSAGE_REQUEST_HEAD
+        payload = data.payload
+        return [
+            b"".join(
+                [
+                    map_head,
+                    request_id_key,
+                    _cbor_text(data.request_id),
+                    name_key,
+                    _cbor_text(data.name),
+                    payload_key,
+                    _cbor_head(2, len(payload)),
+                ]
+            ),
+            payload,
+        ]
+
+    @staticmethod
+    def encode_request(operation, data):
+        """
+        Encode a request into a message frame: the frame header followed by the CBOR payload.
+        Returns the frame as one or two chunks, to be written to the socket in order.
+        """
+        if type(data) is AppendMessageRequest and type(data.payload) is bytes:
+            chunks = Codec.__encode_append_message_request(data)
+        else:
+            chunks = [cbor2.dumps(data.as_dict())]
+
+        length = sum(len(c) for c in chunks)
+        if length + 1 > UtilInternal._MAX_PACKET_SIZE:
+            raise RequestPayloadTooLargeException()
+        header = bytes(
+            [
+                *UtilInternal.int_to_bytes(length + 1),
+                *UtilInternal.int_to_bytes(operation.value, length=1),
+            ]
+        )
+        head = b"".join([header, *chunks[:-1]])
+        tail = chunks[-1]
+        if len(tail) <= Codec.__COALESCE_LIMIT:
+            return [head + tail]
+        return [head, tail]
+
+    @staticmethod
+    def __status(d):
+        status = d.get("status")
+        return None if status is None else ResponseStatusCode(status)
+
+    @staticmethod
+    def __decode_message(d):
+        message = Message.__new__(Message)
+        message._Message__stream_name = d.get("streamName")
+        message._Message__sequence_number = d.get("sequenceNumber")
+        message._Message__ingest_time = d.get("ingestTime")
+        message._Message__payload = d.get("payload")
+        return message
+
+    @staticmethod
+    def __decode_read_messages_response(d):
+        response = ReadMessagesResponse.__new__(ReadMessagesResponse)
+        messages = d.get("messages")
+        response._ReadMessagesResponse__request_id = d.get("requestId")
+        response._ReadMessagesResponse__messages = (
+            None if messages is None else [Codec.__decode_message(m) for m in messages]
+        )
+        response._ReadMessagesResponse__status = Codec.__status(d)
+        response._ReadMessagesResponse__error_message = d.get("errorMessage")
+        return response
+
+    @staticmethod
+    def __decode_append_message_response(d):
+        response = AppendMessageResponse.__new__(AppendMessageResponse)
+        response._AppendMessageResponse__request_id = d.get("requestId")
+        response._AppendMessageResponse__status = Codec.__status(d)
+        response._AppendMessageResponse__error_message = d.get("errorMessage")
+        response._AppendMessageResponse__sequence_number = d.get("sequenceNumber")
+        return response
+
+    __DECODERS = {
+        ReadMessagesResponse: __decode_read_messages_response.__func__,
+        AppendMessageResponse: __decode_append_message_response.__func__,
+    }
+
+    @staticmethod
+    def decode_response(response_type, payload):
+        """
+        Build a response of response_type from its decoded CBOR map.
+        """
+        decoder = Codec.__DECODERS.get(response_type)
+        if decoder is None:
+            return response_type.from_dict(payload)
+        return decoder(payload)
@@ -0,0 +1,115 @@
+import os
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+POOL_CONNECTIONS = int(os.environ.get('HTTP_POOL_CONNECTIONS', 4))
+POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', 8))
+MAX_RETRIES = int(os.environ.get('HTTP_MAX_RETRIES', 3))
+BACKOFF_FACTOR = float(os.environ.get('HTTP_BACKOFF_FACTOR', 0.3))
+CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 3.05))
+READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', 10))
+
+RETRY_STATUS_CODES = (502, 503, 504)
+
+class SessionRegistry:
+    """
+    Keeps one keep-alive requests.Session per application endpoint for the lifetime
+    of the Greengrass container, so consecutive readings to the same application
+    reuse pooled TCP connections instead of opening a new one per request.
+
+    Only idempotent methods are retried; POSTs are sent once so a reading is never
+    delivered twice.
+    """
+    def __init__(self,
+                 pool_connections=POOL_CONNECTIONS,
+                 pool_maxsize=POOL_MAXSIZE,
+                 max_retries=MAX_RETRIES,
+                 backoff_factor=BACKOFF_FACTOR,
+                 timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def session(self, url):
+        endpoint = self._endpoint(url)
+        with self._lock:
+            session = self._sessions.get(endpoint)
+            if session is None:
+                session = self._sessions[endpoint] = self._new_session()
+            return session
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session(url).request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def stats(self):
+        """
+        Connection counters summed over every pool. Requests served on an existing
+        keep-alive connection are counted as reused.
+        """
+        with self._lock:
+            sessions = list(self._sessions.values())
+        requests_sent = 0
+        connections = 0
+        for session in sessions:
+            for adapter in set(session.adapters.values()):
+                for key in adapter.poolmanager.pools.keys():
+                    pool = adapter.poolmanager.pools.get(key)
+                    if pool is None:
+                        continue
+                    requests_sent += pool.num_requests
+                    connections += pool.num_connections
+        return {
+            'sessions': len(sessions),
+            'requests': requests_sent,
+            'connections': connections,
+            'reused': max(requests_sent - connections, 0),
+        }
+
+    def close(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+    def _new_session(self):
+        retry = Retry(
+            total=self.max_retries,
+            connect=self.max_retries,
+            read=self.max_retries,
+            status=self.max_retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=RETRY_STATUS_CODES,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=retry,
+        )
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    @staticmethod
+    def _endpoint(url):
+        parts = urlsplit(url)
+        return '%s://%s' % (parts.scheme, parts.netloc)
+
+sessions = SessionRegistry()
@@ -0,0 +1,196 @@
+import os
+import json
+import base64
+import hashlib
+import logging
+import threading
+import time
+
+MODEL_STORE_PATH = os.environ.get('MODEL_STORE_PATH', '/home/pi/models')
+# Transfers which got no frame for this many seconds are abandoned, with their partly written file
+FRAME_TRANSFER_TIMEOUT = int(os.environ.get('FRAME_TRANSFER_TIMEOUT', 600))
+
+class ModelStore:
+    """
+    Content-addressed store of model artifacts on the edge. Every artifact is kept
+    once under objects/<sha256>, and index.json maps each model name to the hash
+    and S3 ETag of its current version. version(name) is what the edge reports to
+    modelTrainingResponsePublisher, which answers 'unchanged' (304) instead of
+    sending the artifact again when it matches.
+    """
+    def __init__(self, root=MODEL_STORE_PATH):
+        self.root = root
+        self.objects_path = os.path.join(root, 'objects')
+        self.index_path = os.path.join(root, 'index.json')
+        self._lock = threading.Lock()
+        os.makedirs(self.objects_path, exist_ok=True)
+
+    def path(self, sha256):
+        return os.path.join(self.objects_path, sha256)
+
+    def has(self, sha256):
+        return os.path.exists(self.path(sha256))
+
+    def current(self, name):
+        """Return the entry of name's current version, or None if there is none."""
+        return self._load_index().get(name)
+
+    def current_path(self, name):
+        entry = self.current(name)
+        return None if entry is None else self.path(entry['sha256'])
+
+    def version(self, name):
+        """Return the fields to send to the publisher for name, empty if it has no version yet."""
+        entry = self.current(name)
+        if entry is None:
+            return {}
+        version = {'sha256': entry['sha256']}
+        if entry.get('etag'):
+            version['etag'] = entry['etag']
+        return version
+
+    def put(self, name, chunks, etag=None, sha256=None):
+        """
+        Store the artifact made of chunks (an iterable of bytes) as name's current
+        version and return its hash. An artifact already in the store is not written
+        again. Raises ValueError if sha256 is given and does not match the content.
+        """
+        digest = hashlib.sha256()
+        tmp_path = os.path.join(self.objects_path, '.%s.%d.tmp' % (name, threading.get_ident()))
+        try:
+            with open(tmp_path, 'wb') as f:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    f.write(chunk)
+            content_hash = digest.hexdigest()
+            if sha256 is not None and sha256 != content_hash:
+                raise ValueError('Model %s has hash %s, expected %s' % (name, content_hash, sha256))
+            if self.has(content_hash):
+                os.remove(tmp_path)
+            else:
+                os.replace(tmp_path, self.path(content_hash))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.set_current(name, content_hash, etag)
+        return content_hash
+
+    def put_response(self, response):
+        """
+        Store the artifact of an inline publisher response, or keep the current
+        version if the response is 'unchanged'. Returns the path of the artifact.
+        """
+        name = response['file_name']
+        if response['response_code'] == 304:
+            return self.current_path(name)
+        if response['response_code'] != 200:
+            raise LookupError('Model %s could not be fetched: %s' % (name, response.get('message')))
+        sha256 = self.put(name, [bytes.fromhex(response['payload'])], etag=response.get('ETag'), sha256=response.get('sha256'))
+        return self.path(sha256)
+
+    def set_current(self, name, sha256, etag=None):
+        with self._lock:
+            index = self._load_index()
+            index[name] = {'sha256': sha256, 'etag': etag}
+            tmp_path = self.index_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(index, f)
+            os.replace(tmp_path, self.index_path)
+
+    def garbage_collect(self):
+        """Remove every stored artifact that is not the current version of a model."""
+        with self._lock:
+            keep = set(entry['sha256'] for entry in self._load_index().values())
+            for file_name in os.listdir(self.objects_path):
+                if file_name not in keep and not file_name.startswith('.'):
+                    os.remove(os.path.join(self.objects_path, file_name))
+
+    def _load_index(self):
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+class FrameAssembler:
+    """
+    Reassembles a model streamed by modelTrainingResponsePublisher as numbered
+    frames. Each chunk is checked against its SHA-256 and written at its offset,
+    so frames may arrive in any order or more than once. Once every frame of the
+    artifact has arrived, it is added to the store as the model's current version.
+
+    Every version (ETag) of a model is assembled in a file of its own, so late or
+    redelivered frames of another version never disturb the transfer in progress.
+    Completing a version abandons the transfers of the model started before it,
+    and transfers without a frame for timeout seconds are abandoned as well.
+    """
+    def __init__(self, store, timeout=FRAME_TRANSFER_TIMEOUT, clock=time.monotonic):
+        self.store = store
+        self.timeout = timeout
+        self.clock = clock
+        self._transfers = {}
+        self._started = 0
+        self._lock = threading.Lock()
+
+    def add(self, frame):
+        """
+        Add a base64 (str) or binary (bytes) frame. Returns the path of the stored
+        artifact once the frame completed it, None otherwise.
+        """
+        header, chunk = self.decode_frame(frame)
+        if hashlib.sha256(chunk).hexdigest() != header['sha256']:
+            logging.error('Dropping frame %d of %s: checksum mismatch', header['seq'], header['file_name'])
+            return None
+
+        key = (header['file_name'], header['etag'])
+        current = self.store.current(header['file_name'])
+        if current is not None and current.get('etag') == header['etag']:
+            # Late or repeated frames of a version which is already stored
+            return None
+
+        with self._lock:
+            now = self.clock()
+            for other in [k for k, t in self._transfers.items() if k != key and now - t['updated'] > self.timeout]:
+                logging.error('Abandoning transfer of %s %s: no frame for %ds', other[0], other[1], self.timeout)
+                self._discard(other)
+            transfer = self._transfers.get(key)
+            if transfer is None:
+                tmp_path = os.path.join(self.store.objects_path, '.%s.%s.frames' % (
+                    header['file_name'], hashlib.sha256(header['etag'].encode('utf-8')).hexdigest()[:16]))
+                self._started += 1
+                transfer = self._transfers[key] = {
+                    'path': tmp_path, 'total': header['total'], 'received': set(), 'started': self._started,
+                }
+                open(tmp_path, 'wb').close()
+            transfer['updated'] = now
+            with open(transfer['path'], 'r+b') as f:
+                f.seek(header['offset'])
+                f.write(chunk)
+            transfer['received'].add(header['seq'])
+            if len(transfer['received']) < transfer['total']:
+                return None
+            del self._transfers[key]
+            # Transfers of the model started before this one are of versions it supersedes
+            for other in [k for k, t in self._transfers.items() if k[0] == key[0] and t['started'] < transfer['started']]:
+                self._discard(other)
+
+        try:
+            with open(transfer['path'], 'rb') as f:
+                sha256 = self.store.put(header['file_name'], iter(lambda: f.read(1024 * 1024), b''), etag=header['etag'])
+        finally:
+            os.remove(transfer['path'])
+        return self.store.path(sha256)
+
+    @staticmethod
+    def decode_frame(frame):
+        if isinstance(frame, str):
+            header = json.loads(frame)
+            return header, base64.b64decode(header.pop('data'))
+        header, chunk = frame.split(b'\n', 1)
+        return json.loads(header.decode('utf-8')), chunk
+
+    def _discard(self, key):
+        transfer = self._transfers.pop(key)
+        if os.path.exists(transfer['path']):
+            os.remove(transfer['path'])
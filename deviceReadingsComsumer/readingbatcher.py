@@ -0,0 +1,73 @@
+import os
+import time
+import logging
+import threading
+
+BATCH_SIZE = int(os.environ.get('BATCH_SIZE', 50))
+BATCH_LINGER_MS = int(os.environ.get('BATCH_LINGER_MS', 1000))
+
+class ReadingBatcher:
+    """
+    Buffers readings per key (the resolved application) and hands each buffer to
+    send(key, readings) once it holds batch_size readings or its oldest reading has
+    waited linger seconds, whichever comes first.
+
+    Size-triggered flushes run on the caller's thread. Linger-triggered flushes run
+    on a daemon thread, so they only fire while the container is alive, i.e. for
+    long-lived (pinned) Greengrass functions.
+    """
+    def __init__(self, send, batch_size=BATCH_SIZE, linger=BATCH_LINGER_MS / 1000):
+        self.send = send
+        self.batch_size = batch_size
+        self.linger = linger
+        self._batches = {}
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def add(self, key, reading):
+        with self._cond:
+            batch = self._batches.get(key)
+            if batch is None:
+                batch = self._batches[key] = (time.monotonic() + self.linger, [])
+                self._ensure_thread()
+                self._cond.notify()
+            batch[1].append(reading)
+            if len(batch[1]) < self.batch_size:
+                return
+            del self._batches[key]
+        self._send(key, batch[1])
+
+    def flush(self):
+        with self._cond:
+            batches = self._batches
+            self._batches = {}
+        for key, (_, readings) in batches.items():
+            self._send(key, readings)
+
+    def pending(self):
+        with self._cond:
+            return sum(len(readings) for _, readings in self._batches.values())
+
+    def _send(self, key, readings):
+        try:
+            self.send(key, readings)
+        except Exception as e:
+            logging.error('Failed to send batch of %d readings: %s', len(readings), repr(e))
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                expired = [key for key, (deadline, _) in self._batches.items() if deadline <= now]
+                if not expired:
+                    deadlines = [deadline for deadline, _ in self._batches.values()]
+                    self._cond.wait(min(deadlines) - now if deadlines else None)
+                    continue
+                ready = [(key, self._batches.pop(key)[1]) for key in expired]
+            for key, readings in ready:
+                self._send(key, readings)
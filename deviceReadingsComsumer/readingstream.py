@@ -0,0 +1,158 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+from greengrasssdk.stream_manager import (
+    MessageStreamDefinition,
+    NotEnoughMessagesException,
+    Persistence,
+    ReadMessagesOptions,
+    SharedStreamManagerClient,
+    StrategyOnFull,
+)
+
+STREAM_NAME = os.environ.get('READINGS_STREAM_NAME', 'DeviceReadings')
+STREAM_MAX_SIZE = int(os.environ.get('READINGS_STREAM_MAX_SIZE', 256 * 1024 * 1024))
+
+DRAIN_BATCH_SIZE = int(os.environ.get('DRAIN_BATCH_SIZE', 500))
+DRAIN_READ_TIMEOUT_MS = int(os.environ.get('DRAIN_READ_TIMEOUT_MS', 1000))
+DRAIN_RETRY_DELAY = float(os.environ.get('DRAIN_RETRY_DELAY', 5))
+CHECKPOINT_PATH = os.environ.get('DRAIN_CHECKPOINT_PATH', '/home/pi/readings-stream.checkpoint')
+
+class ReadingStream:
+    """
+    Durable ingest path for device readings. append() stores a reading in a local
+    StreamManager stream and returns as soon as StreamManager has accepted it. A
+    drain thread reads the stream in batches. route(reading) turns each reading
+    into a (key, item) pair, or None to drop it, and forward(key, items) sends
+    the items of one key (the application) and reports whether they arrived.
+
+    The checkpoint in CHECKPOINT_PATH holds the next sequence number to read,
+    which only moves once every key of a batch was delivered, and for each key
+    that got ahead of it, the sequence number up to which that key already has
+    its readings. A batch read again after a failure is then only forwarded to
+    the keys which did not receive it, and readings are forwarded to each key at
+    least once even if an application or the container goes down.
+    """
+    def __init__(self, stream_name=STREAM_NAME, checkpoint_path=CHECKPOINT_PATH, client=None):
+        self.stream_name = stream_name
+        self.checkpoint_path = checkpoint_path
+        self._client = client
+        self._stream_ready = False
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                self._client = SharedStreamManagerClient()
+            if not self._stream_ready:
+                self._ensure_stream(self._client)
+                self._stream_ready = True
+            return self._client
+
+    def append(self, reading):
+        return self.client.append_message(self.stream_name, json.dumps(reading).encode())
+
+    def start_drain(self, route, forward):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, args=(route, forward), daemon=True)
+                self._thread.start()
+
+    def drain_once(self, route, forward):
+        """
+        Read one batch starting at the checkpoint and forward it to every key which
+        does not have it yet. Returns the next sequence number to read, or None when
+        some key reported its part as undelivered, in which case only the keys that
+        received theirs are committed.
+        """
+        start_sequence_number, delivered = self.load_checkpoint()
+        options = ReadMessagesOptions(
+            desired_start_sequence_number=start_sequence_number,
+            min_message_count=1,
+            max_message_count=DRAIN_BATCH_SIZE,
+            read_timeout_millis=DRAIN_READ_TIMEOUT_MS,
+        )
+        try:
+            messages = self.client.read_messages(self.stream_name, options)
+        except NotEnoughMessagesException:
+            return start_sequence_number
+
+        batches = OrderedDict()
+        for message in messages:
+            try:
+                routed = route(json.loads(message.payload.decode('utf-8')))
+            except Exception as e:
+                # A reading that cannot be parsed or routed would otherwise stop the drain at it for good
+                logging.error('Dropping malformed reading %d: %s', message.sequence_number, repr(e))
+                continue
+            if routed is None:
+                continue
+            key, item = routed
+            # Readings up to delivered[key] reached this key before a failure of another one
+            if message.sequence_number >= delivered.get(key, 0):
+                batches.setdefault(key, []).append(item)
+
+        next_sequence_number = messages[-1].sequence_number + 1
+        failed = False
+        for key, items in batches.items():
+            if forward(key, items):
+                delivered[key] = next_sequence_number
+            else:
+                failed = True
+        if failed:
+            self.save_checkpoint(start_sequence_number, delivered)
+            return None
+
+        self.save_checkpoint(next_sequence_number, delivered)
+        return next_sequence_number
+
+    def load_checkpoint(self):
+        """Return the next sequence number to read and the per-key sequence numbers ahead of it."""
+        try:
+            with open(self.checkpoint_path) as f:
+                checkpoint = json.loads(f.read().strip() or '0')
+        except (IOError, ValueError):
+            return 0, {}
+        if isinstance(checkpoint, int):
+            # Checkpoints written before per-key progress was kept
+            return checkpoint, {}
+        delivered = dict((tuple(key) if isinstance(key, list) else key, sequence_number)
+                         for key, sequence_number in checkpoint['delivered'])
+        return checkpoint['next'], delivered
+
+    def save_checkpoint(self, sequence_number, delivered=None):
+        delivered = [
+            [key, key_sequence_number]
+            for key, key_sequence_number in (delivered or {}).items()
+            if key_sequence_number > sequence_number
+        ]
+        tmp_path = self.checkpoint_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'next': sequence_number, 'delivered': delivered}, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _ensure_stream(self, client):
+        if self.stream_name in client.list_streams():
+            return
+        client.create_message_stream(MessageStreamDefinition(
+            name=self.stream_name,
+            max_size=STREAM_MAX_SIZE,
+            strategy_on_full=StrategyOnFull.OverwriteOldestData,
+            persistence=Persistence.File,
+        ))
+
+    def _run(self, route, forward):
+        while True:
+            try:
+                next_sequence_number = self.drain_once(route, forward)
+            except Exception as e:
+                logging.error('Failed to drain stream %s: %s', self.stream_name, repr(e))
+                next_sequence_number = None
+            if next_sequence_number is None:
+                time.sleep(DRAIN_RETRY_DELAY)
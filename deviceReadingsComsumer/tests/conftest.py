@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+# The handler's helper modules and the vendored greengrasssdk are imported the way the Lambda imports them
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fakestreammanager import FakeStreamManager
+
+
+@pytest.fixture
+def server():
+    server = FakeStreamManager()
+    yield server
+    server.stop()
@@ -0,0 +1,175 @@
+import asyncio
+import threading
+
+import cbor2
+
+from greengrasssdk.stream_manager.data import (
+    AppendMessageRequest,
+    ConnectRequest,
+    CreateMessageStreamRequest,
+    DeleteMessageStreamRequest,
+    DescribeMessageStreamRequest,
+    ListStreamsRequest,
+    Operation,
+    ReadMessagesRequest,
+    ResponseStatusCode,
+)
+
+CONNECT_VERSION = 1
+
+class FakeStreamManager:
+    """
+    In-process StreamManager server speaking the same CBOR frame protocol as the
+    real one, for tests. Streams are kept in memory as lists of payloads, so
+    sequence numbers are list indices.
+
+    Tests can make it misbehave: drop_after drops the connection on the next
+    request once that many requests were received, hold keeps requests
+    unanswered, accepting=False closes new connections right away and
+    drop_connections() closes every open connection.
+    """
+    def __init__(self):
+        self.streams = {}
+        self.requests = []
+        self.connections = 0
+        self.drop_after = None
+        self.hold = False
+        self.accepting = True
+        self._writers = []
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self.server = self.loop.run_until_complete(asyncio.start_server(self._handle, '127.0.0.1', 0))
+            self.port = self.server.sockets[0].getsockname()[1]
+            ready.set()
+            self.loop.run_forever()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        ready.wait()
+
+    def drop_connections(self):
+        def drop():
+            for writer in self._writers:
+                writer.close()
+            del self._writers[:]
+        self.loop.call_soon_threadsafe(drop)
+
+    def stop(self):
+        async def shutdown():
+            self.server.close()
+            for writer in self._writers:
+                writer.close()
+            await self.server.wait_closed()
+        asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+
+    async def _read_frame(self, reader):
+        header = await reader.readexactly(5)
+        length = int.from_bytes(header[:4], 'big', signed=True)
+        payload = await reader.readexactly(length - 1)
+        return Operation(header[4]), cbor2.loads(payload)
+
+    def _write_frame(self, writer, operation, response):
+        payload = cbor2.dumps(response)
+        writer.write((len(payload) + 1).to_bytes(4, 'big', signed=True) + bytes([operation.value]) + payload)
+
+    async def _handle(self, reader, writer):
+        if not self.accepting:
+            writer.close()
+            return
+        self._writers.append(writer)
+        try:
+            await reader.readexactly(1)
+            _, connect = await self._read_frame(reader)
+            ConnectRequest.from_dict(connect)
+            self.connections += 1
+            writer.write(bytes([CONNECT_VERSION]))
+            self._write_frame(writer, Operation.ConnectResponse, {
+                'requestId': connect['requestId'],
+                'status': ResponseStatusCode.Success.value,
+                'protocolVersion': connect['protocolVersion'],
+                'serverVersion': 'fake',
+                'clientIdentifier': 'fake',
+            })
+            await writer.drain()
+            while True:
+                operation, request = await self._read_frame(reader)
+                self.requests.append((operation, request))
+                if self.drop_after is not None and len(self.requests) > self.drop_after:
+                    self.drop_after = None
+                    writer.close()
+                    return
+                if self.hold:
+                    continue
+                self._write_frame(writer, *self._respond(operation, request))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+
+    def _respond(self, operation, request):
+        request_id = request['requestId']
+        if operation == Operation.AppendMessage:
+            request = AppendMessageRequest.from_dict(request)
+            stream = self.streams.get(request.name)
+            if stream is None:
+                return Operation.AppendMessageResponse, self._error(request_id, ResponseStatusCode.ResourceNotFound)
+            stream.append(request.payload)
+            return Operation.AppendMessageResponse, {
+                'requestId': request_id, 'status': 0, 'sequenceNumber': len(stream) - 1,
+            }
+        if operation == Operation.ReadMessages:
+            request = ReadMessagesRequest.from_dict(request)
+            return Operation.ReadMessagesResponse, self._read(request)
+        if operation == Operation.CreateMessageStream:
+            request = CreateMessageStreamRequest.from_dict(request)
+            self.streams.setdefault(request.definition.name, [])
+            return Operation.CreateMessageStreamResponse, {'requestId': request_id, 'status': 0}
+        if operation == Operation.DeleteMessageStream:
+            request = DeleteMessageStreamRequest.from_dict(request)
+            self.streams.pop(request.name, None)
+            return Operation.DeleteMessageStreamResponse, {'requestId': request_id, 'status': 0}
+        if operation == Operation.ListStreams:
+            ListStreamsRequest.from_dict(request)
+            return Operation.ListStreamsResponse, {'requestId': request_id, 'status': 0, 'streams': list(self.streams)}
+        if operation == Operation.DescribeMessageStream:
+            request = DescribeMessageStreamRequest.from_dict(request)
+            if request.name not in self.streams:
+                return Operation.DescribeMessageStreamResponse, self._error(request_id, ResponseStatusCode.ResourceNotFound)
+            return Operation.DescribeMessageStreamResponse, {
+                'requestId': request_id,
+                'status': 0,
+                'messageStreamInfo': {
+                    'definition': {'name': request.name},
+                    'storageStatus': {
+                        'oldestSequenceNumber': 0,
+                        'newestSequenceNumber': len(self.streams[request.name]) - 1,
+                        'totalBytes': sum(len(p) for p in self.streams[request.name]),
+                    },
+                },
+            }
+        return Operation.UnknownOperationError, self._error(request_id, ResponseStatusCode.UnknownOperation)
+
+    def _read(self, request):
+        stream = self.streams.get(request.stream_name)
+        if stream is None:
+            return self._error(request.request_id, ResponseStatusCode.ResourceNotFound)
+        options = request.read_messages_options
+        start = options.desired_start_sequence_number or 0
+        end = min(len(stream), start + (options.max_message_count or 1))
+        if end - start < (options.min_message_count or 1):
+            return self._error(request.request_id, ResponseStatusCode.NotEnoughMessages)
+        return {
+            'requestId': request.request_id,
+            'status': 0,
+            'messages': [
+                {'streamName': request.stream_name, 'sequenceNumber': i, 'ingestTime': 1, 'payload': stream[i]}
+                for i in range(start, end)
+            ],
+        }
+
+    def _error(self, request_id, status):
+        return {'requestId': request_id, 'status': status.value, 'errorMessage': status.name}
@@ -0,0 +1,168 @@
+import cbor2
+import pytest
+
+from greengrasssdk.stream_manager.codec import Codec
+from greengrasssdk.stream_manager.data import (
+    AppendMessageRequest,
+    AppendMessageResponse,
+    ConnectRequest,
+    CreateMessageStreamRequest,
+    CreateMessageStreamResponse,
+    DeleteMessageStreamRequest,
+    DeleteMessageStreamResponse,
+    DescribeMessageStreamRequest,
+    DescribeMessageStreamResponse,
+    ExportDefinition,
+    KinesisConfig,
+    ListStreamsRequest,
+    ListStreamsResponse,
+    MessageFrame,
+    MessageStreamDefinition,
+    Operation,
+    Persistence,
+    ReadMessagesOptions,
+    ReadMessagesRequest,
+    ReadMessagesResponse,
+    StrategyOnFull,
+    UnknownOperationError,
+    UpdateMessageStreamRequest,
+    UpdateMessageStreamResponse,
+)
+from greengrasssdk.stream_manager.exceptions import RequestPayloadTooLargeException
+from greengrasssdk.stream_manager.utilinternal import UtilInternal
+
+REQUEST_ID = 'e6e3c5c5-6a0b-4d4a-9c3d-2f3c1b8f6a55'
+
+# Sizes around every CBOR length encoding, and around the limit above which a payload is written as its own chunk
+PAYLOAD_SIZES = [0, 1, 23, 24, 255, 256, 65535, 65536, 65537, 70000, 1 << 20]
+
+DEFINITION = MessageStreamDefinition(
+    name='DeviceReadings',
+    max_size=256 * 1024 * 1024,
+    strategy_on_full=StrategyOnFull.OverwriteOldestData,
+    persistence=Persistence.File,
+    export_definition=ExportDefinition(kinesis=[KinesisConfig(identifier='Export', kinesis_stream_name='readings')]),
+)
+
+REQUESTS = [
+    (Operation.Connect, ConnectRequest(
+        request_id=REQUEST_ID, protocol_version='1.1.0', other_supported_protocol_versions=['1.0.0'],
+        sdk_version='1.1.0', auth_token='token',
+    )),
+    (Operation.CreateMessageStream, CreateMessageStreamRequest(request_id=REQUEST_ID, definition=DEFINITION)),
+    (Operation.UpdateMessageStream, UpdateMessageStreamRequest(request_id=REQUEST_ID, definition=DEFINITION)),
+    (Operation.DeleteMessageStream, DeleteMessageStreamRequest(request_id=REQUEST_ID, name='DeviceReadings')),
+    (Operation.DescribeMessageStream, DescribeMessageStreamRequest(request_id=REQUEST_ID, name='DeviceReadings')),
+    (Operation.ReadMessages, ReadMessagesRequest(
+        request_id=REQUEST_ID, stream_name='DeviceReadings', read_messages_options=ReadMessagesOptions(
+            desired_start_sequence_number=42, min_message_count=1, max_message_count=500, read_timeout_millis=1000,
+        ),
+    )),
+    (Operation.ListStreams, ListStreamsRequest(request_id=REQUEST_ID)),
+    (Operation.AppendMessage, AppendMessageRequest(request_id=REQUEST_ID, name='DeviceReadings', payload=b'reading')),
+    (Operation.AppendMessage, AppendMessageRequest(request_id=REQUEST_ID, name='Réadings ünicode', payload=b'')),
+]
+
+
+def encode_generic(operation, data):
+    # The path every request took before the codec: as_dict(), cbor2 and a frame header
+    return b''.join(UtilInternal.encode_frame(MessageFrame(operation=operation, payload=cbor2.dumps(data.as_dict()))))
+
+
+def decode_frame(frame):
+    length = UtilInternal.int_from_bytes(frame[:4])
+    assert length == len(frame) - 4
+    return Operation(frame[4]), cbor2.loads(frame[5:])
+
+
+@pytest.mark.parametrize('operation, data', REQUESTS, ids=lambda v: type(v).__name__)
+def test_encode_request_matches_generic_path(operation, data):
+    chunks = Codec.encode_request(operation, data)
+    assert b''.join(chunks) == encode_generic(operation, data)
+
+    decoded_operation, payload = decode_frame(b''.join(chunks))
+    assert decoded_operation == operation
+    assert type(data).from_dict(payload).as_dict() == data.as_dict()
+
+
+@pytest.mark.parametrize('size', PAYLOAD_SIZES)
+@pytest.mark.parametrize('payload_type', [bytes, bytearray])
+def test_encode_append_message_request_matches_generic_path(size, payload_type):
+    data = AppendMessageRequest(
+        request_id=REQUEST_ID, name='DeviceReadings', payload=payload_type(bytes(range(256)) * (size // 256 + 1))[:size]
+    )
+    chunks = Codec.encode_request(Operation.AppendMessage, data)
+    assert b''.join(chunks) == encode_generic(Operation.AppendMessage, data)
+
+    # Large payloads are handed to the socket as they are instead of being copied into the frame
+    if payload_type is bytes and size > 64 * 1024:
+        assert len(chunks) == 2 and chunks[1] is data.payload
+    elif size <= 64 * 1024 - 128:
+        assert len(chunks) == 1
+
+    _, payload = decode_frame(b''.join(chunks))
+    assert AppendMessageRequest.from_dict(payload).payload == data.payload
+
+
+def test_encode_request_rejects_frames_over_the_packet_size(monkeypatch):
+    monkeypatch.setattr(UtilInternal, '_MAX_PACKET_SIZE', 1024)
+    data = AppendMessageRequest(request_id=REQUEST_ID, name='DeviceReadings', payload=b'\0' * 1024)
+    with pytest.raises(RequestPayloadTooLargeException):
+        Codec.encode_request(Operation.AppendMessage, data)
+    with pytest.raises(RequestPayloadTooLargeException):
+        UtilInternal.encode_frame(MessageFrame(operation=Operation.AppendMessage, payload=cbor2.dumps(data.as_dict())))
+
+
+def read_messages_response(count, size):
+    return {
+        'requestId': REQUEST_ID,
+        'status': 0,
+        'messages': [
+            {'streamName': 'DeviceReadings', 'sequenceNumber': i, 'ingestTime': 1613494677000 + i, 'payload': bytes([i % 256]) * size}
+            for i in range(count)
+        ],
+    }
+
+
+RESPONSES = [
+    (ReadMessagesResponse, read_messages_response(0, 0)),
+    (ReadMessagesResponse, read_messages_response(3, 1)),
+    (ReadMessagesResponse, read_messages_response(100, 1024)),
+    (ReadMessagesResponse, read_messages_response(2, 70000)),
+    (ReadMessagesResponse, {'requestId': REQUEST_ID, 'status': 13, 'errorMessage': 'Not enough messages'}),
+    (AppendMessageResponse, {'requestId': REQUEST_ID, 'status': 0, 'sequenceNumber': 123456}),
+    (AppendMessageResponse, {'requestId': REQUEST_ID, 'status': 5, 'errorMessage': 'Stream not found'}),
+    (CreateMessageStreamResponse, {'requestId': REQUEST_ID, 'status': 0}),
+    (DeleteMessageStreamResponse, {'requestId': REQUEST_ID, 'status': 0}),
+    (UpdateMessageStreamResponse, {'requestId': REQUEST_ID, 'status': 17, 'errorMessage': 'Not allowed'}),
+    (ListStreamsResponse, {'requestId': REQUEST_ID, 'status': 0, 'streams': ['a', 'b']}),
+    (DescribeMessageStreamResponse, {
+        'requestId': REQUEST_ID,
+        'status': 0,
+        'messageStreamInfo': {
+            'definition': DEFINITION.as_dict(),
+            'storageStatus': {'oldestSequenceNumber': 0, 'newestSequenceNumber': 9, 'totalBytes': 1024},
+        },
+    }),
+    (UnknownOperationError, {'requestId': REQUEST_ID, 'status': 18, 'errorMessage': 'Unknown operation'}),
+]
+
+
+@pytest.mark.parametrize('response_type, response', RESPONSES, ids=lambda v: getattr(v, '__name__', ''))
+def test_decode_response_matches_from_dict(response_type, response):
+    # Responses are decoded from what cbor2 makes of the frame, exactly as the client gets them
+    payload = cbor2.loads(cbor2.dumps(response))
+    decoded = Codec.decode_response(response_type, payload)
+    expected = response_type.from_dict(cbor2.loads(cbor2.dumps(response)))
+
+    assert type(decoded) is response_type
+    assert decoded.as_dict() == expected.as_dict()
+    assert decoded.request_id == expected.request_id
+    assert decoded.status == expected.status
+    if response_type is ReadMessagesResponse and expected.messages:
+        for message, expected_message in zip(decoded.messages, expected.messages):
+            assert type(message.payload) is bytes
+            assert message.payload == expected_message.payload
+            assert message.sequence_number == expected_message.sequence_number
+            assert message.ingest_time == expected_message.ingest_time
+            assert message.stream_name == expected_message.stream_name
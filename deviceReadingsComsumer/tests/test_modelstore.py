@@ -0,0 +1,145 @@
+import base64
+import hashlib
+import json
+import os
+import random
+
+import pytest
+
+from modelstore import FrameAssembler, ModelStore
+
+MODEL = os.urandom(10000)
+CHUNK_SIZE = 1024
+
+
+def make_frames(data, etag, encoding='base64', file_name='model.tar.gz', chunk_size=CHUNK_SIZE):
+    # Frames as modelTrainingResponsePublisher.publish_model_frames publishes them
+    total = max(1, (len(data) + chunk_size - 1) // chunk_size)
+    frames = []
+    for seq in range(total):
+        chunk = data[seq * chunk_size:(seq + 1) * chunk_size]
+        header = {
+            'file_name': file_name, 'etag': etag, 'seq': seq, 'total': total, 'offset': seq * chunk_size,
+            'length': len(chunk), 'sha256': hashlib.sha256(chunk).hexdigest(), 'encoding': encoding,
+        }
+        if encoding == 'base64':
+            frames.append(json.dumps(dict(header, data=base64.b64encode(chunk).decode())))
+        else:
+            frames.append(json.dumps(header).encode() + b'\n' + chunk)
+    return frames
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ModelStore(str(tmp_path / 'models'))
+
+
+def leftover_files(store):
+    return [name for name in os.listdir(store.objects_path) if name.startswith('.')]
+
+
+def test_put_stores_each_artifact_once_and_tracks_the_current_version(store):
+    sha256 = store.put('model.tar.gz', [MODEL[:100], MODEL[100:]], etag='"v1"')
+    assert sha256 == hashlib.sha256(MODEL).hexdigest()
+    assert read(store.current_path('model.tar.gz')) == MODEL
+    assert store.version('model.tar.gz') == {'sha256': sha256, 'etag': '"v1"'}
+    assert store.version('other') == {}
+
+    # The same content under another name is not written again
+    assert store.put('copy.tar.gz', [MODEL]) == sha256
+    assert os.listdir(store.objects_path) == [sha256]
+
+
+def test_put_rejects_content_not_matching_its_hash(store):
+    with pytest.raises(ValueError):
+        store.put('model.tar.gz', [MODEL], sha256='0' * 64)
+    assert store.current('model.tar.gz') is None
+    assert os.listdir(store.objects_path) == []
+
+
+def test_put_response_stores_200_keeps_304_and_raises_on_errors(store):
+    path = store.put_response({
+        'response_code': 200, 'file_name': 'model.tar.gz', 'ETag': '"v1"', 'payload': MODEL.hex(),
+    })
+    assert read(path) == MODEL
+    assert store.put_response({'response_code': 304, 'file_name': 'model.tar.gz', 'message': 'unchanged'}) == path
+    with pytest.raises(LookupError):
+        store.put_response({'response_code': 404, 'file_name': 'model.tar.gz', 'message': 'NoSuchKey'})
+
+
+def test_garbage_collect_keeps_only_current_versions(store):
+    old = store.put('model.tar.gz', [b'old'])
+    new = store.put('model.tar.gz', [b'new'])
+    store.garbage_collect()
+    assert os.listdir(store.objects_path) == [new]
+    assert not store.has(old)
+
+
+@pytest.mark.parametrize('encoding', ['base64', 'binary'])
+def test_shuffled_and_duplicated_frames_are_assembled_once(store, encoding):
+    frames = make_frames(MODEL, '"v1"', encoding)
+    frames = frames + frames[:3]
+    random.Random(1).shuffle(frames)
+    # The last frame of the artifact completes it, whichever that is
+    last = max(i for i, frame in enumerate(frames) if frames.index(frame) == i)
+
+    assembler = FrameAssembler(store)
+    paths = [assembler.add(frame) for frame in frames]
+    assert [i for i, path in enumerate(paths) if path is not None] == [last]
+    assert read(paths[last]) == MODEL
+    assert store.version('model.tar.gz')['etag'] == '"v1"'
+    assert leftover_files(store) == []
+
+
+def test_corrupt_chunk_is_dropped_until_a_good_copy_arrives(store):
+    frames = make_frames(MODEL, '"v1"')
+    corrupt = json.loads(frames[2])
+    corrupt['data'] = base64.b64encode(b'\0' * CHUNK_SIZE).decode()
+
+    assembler = FrameAssembler(store)
+    for frame in frames[:2] + [json.dumps(corrupt)] + frames[3:]:
+        assert assembler.add(frame) is None
+    assert read(assembler.add(frames[2])) == MODEL
+
+
+def test_late_frames_of_another_version_do_not_disturb_the_transfer(store):
+    old, new = make_frames(b'old model ' * 300, '"v1"'), make_frames(MODEL, '"v2"')
+
+    assembler = FrameAssembler(store)
+    assert assembler.add(new[0]) is None
+    # A redelivered frame of the previous version arrives in the middle of the new transfer
+    assert assembler.add(old[1]) is None
+    for frame in new[1:-1]:
+        assert assembler.add(frame) is None
+    assert read(assembler.add(new[-1])) == MODEL
+    assert store.version('model.tar.gz')['etag'] == '"v2"'
+
+
+def test_completed_version_abandons_transfers_started_before_it(store):
+    old, new = make_frames(b'old model ' * 300, '"v1"'), make_frames(MODEL, '"v2"')
+
+    assembler = FrameAssembler(store)
+    assembler.add(old[0])
+    for frame in new:
+        assembler.add(frame)
+    assert leftover_files(store) == []
+    # Frames of the abandoned version still in flight start it over, and it completes only with all of them
+    assert [assembler.add(frame) for frame in old[1:]] == [None] * (len(old) - 1)
+    assert store.version('model.tar.gz')['etag'] == '"v2"'
+
+
+def test_stale_transfers_are_abandoned(store):
+    now = [0]
+    assembler = FrameAssembler(store, timeout=60, clock=lambda: now[0])
+    assembler.add(make_frames(b'old model ' * 300, '"v1"')[1])
+    assert len(leftover_files(store)) == 1
+
+    now[0] = 61
+    other = make_frames(b'other model', '"v1"', file_name='other.tar.gz')
+    assert read(assembler.add(other[0])) == b'other model'
+    assert leftover_files(store) == []
@@ -0,0 +1,106 @@
+import json
+
+import pytest
+
+from greengrasssdk.stream_manager import StreamManagerClient
+from readingstream import ReadingStream
+
+
+@pytest.fixture
+def client(server):
+    client = StreamManagerClient(port=server.port)
+    yield client
+    client.close()
+
+
+def make_stream(client, tmp_path):
+    return ReadingStream('Readings', checkpoint_path=str(tmp_path / 'checkpoint'), client=client)
+
+
+def route(reading):
+    return reading['app'], reading['n']
+
+
+class Applications:
+    """Records what each application received, failing the ones listed in down"""
+    def __init__(self):
+        self.received = {}
+        self.down = set()
+
+    def forward(self, key, items):
+        if key in self.down:
+            return False
+        self.received.setdefault(key, []).extend(items)
+        return True
+
+
+def test_append_creates_the_stream_and_drain_forwards_per_application(server, client, tmp_path):
+    stream = make_stream(client, tmp_path)
+    for n in range(6):
+        stream.append({'app': 'ab'[n % 2], 'n': n})
+    assert len(server.streams['Readings']) == 6
+
+    applications = Applications()
+    assert stream.drain_once(route, applications.forward) == 6
+    assert applications.received == {'a': [0, 2, 4], 'b': [1, 3, 5]}
+    assert stream.load_checkpoint() == (6, {})
+
+
+def test_failed_application_does_not_make_the_others_receive_readings_again(server, client, tmp_path):
+    stream = make_stream(client, tmp_path)
+    for n in range(4):
+        stream.append({'app': 'ab'[n % 2], 'n': n})
+
+    applications = Applications()
+    applications.down.add('b')
+    assert stream.drain_once(route, applications.forward) is None
+    assert applications.received == {'a': [0, 2]}
+    assert stream.load_checkpoint() == (0, {'a': 4})
+
+    # A restarted drain reads the batch again, and only the application which missed it gets it
+    stream = make_stream(client, tmp_path)
+    stream.append({'app': 'a', 'n': 4})
+    applications.down.clear()
+    assert stream.drain_once(route, applications.forward) == 5
+    assert applications.received == {'a': [0, 2, 4], 'b': [1, 3]}
+    assert stream.load_checkpoint() == (5, {})
+
+
+def test_unroutable_and_malformed_readings_are_dropped(server, client, tmp_path):
+    stream = make_stream(client, tmp_path)
+    stream.append({'app': None, 'n': 0})
+    client.append_message('Readings', b'not json')
+    stream.append({'app': 'a', 'n': 2})
+
+    applications = Applications()
+    assert stream.drain_once(lambda r: route(r) if r['app'] else None, applications.forward) == 3
+    assert applications.received == {'a': [2]}
+
+
+def test_reading_missing_a_field_does_not_stop_the_drain(server, client, tmp_path):
+    stream = make_stream(client, tmp_path)
+    stream.append({'app': 'a', 'n': 0})
+    stream.append({'app': 'a'})
+    stream.append({'app': 'b', 'n': 2})
+
+    # route raises KeyError for the reading without 'n', as building the request of a reading without 'capacity' does
+    applications = Applications()
+    assert stream.drain_once(route, applications.forward) == 3
+    assert applications.received == {'a': [0], 'b': [2]}
+    assert stream.load_checkpoint() == (3, {})
+
+
+def test_empty_stream_keeps_the_checkpoint(server, client, tmp_path):
+    stream = make_stream(client, tmp_path)
+    stream.save_checkpoint(0)
+    stream.client
+    assert stream.drain_once(route, Applications().forward) == 0
+
+
+def test_checkpoint_of_a_single_sequence_number_is_still_read(tmp_path):
+    stream = make_stream(None, tmp_path)
+    (tmp_path / 'checkpoint').write_text('42')
+    assert stream.load_checkpoint() == (42, {})
+    stream.save_checkpoint(42, {('app', 'http://app:80'): 50, ('other', 'http://other:80'): 42})
+    assert json.loads((tmp_path / 'checkpoint').read_text()) == {'next': 42, 'delivered': [[['app', 'http://app:80'], 50]]}
+    assert stream.load_checkpoint() == (42, {('app', 'http://app:80'): 50})
@@ -0,0 +1,124 @@
+import gc
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from greengrasssdk.stream_manager import StreamManagerClient
+from greengrasssdk.stream_manager.data import MessageStreamDefinition, ReadMessagesOptions, StrategyOnFull
+from greengrasssdk.stream_manager.exceptions import StreamManagerException
+
+DEFINITION = MessageStreamDefinition(name='Readings', strategy_on_full=StrategyOnFull.OverwriteOldestData)
+
+
+def make_client(server, **kwargs):
+    kwargs.setdefault('reconnect_initial_delay', 0.01)
+    kwargs.setdefault('reconnect_max_delay', 0.05)
+    return StreamManagerClient(port=server.port, request_timeout=5, **kwargs)
+
+
+@pytest.fixture
+def client(server):
+    client = make_client(server)
+    yield client
+    client.close()
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.005)
+
+
+def start_outage(server, client):
+    server.accepting = False
+    server.drop_connections()
+    wait_until(lambda: not client.connected)
+
+
+def test_read_in_flight_is_sent_again_after_reconnecting(server, client):
+    client.create_message_stream(DEFINITION)
+    client.append_message('Readings', b'reading')
+
+    server.drop_after = len(server.requests)
+    messages = client.read_messages('Readings', ReadMessagesOptions(desired_start_sequence_number=0))
+    assert [m.payload for m in messages] == [b'reading']
+    assert server.connections == 2
+
+
+def test_append_in_flight_fails_when_the_connection_is_lost(server, client):
+    client.create_message_stream(DEFINITION)
+
+    server.drop_after = len(server.requests)
+    start = time.monotonic()
+    with pytest.raises(ConnectionError):
+        client.append_message('Readings', b'reading')
+    assert time.monotonic() - start < 1
+
+    # The client reconnected on its own, and the next append goes through
+    assert client.append_message('Readings', b'reading') == 0
+
+
+def test_request_made_while_reconnecting_waits_for_the_connection(server, client):
+    states = []
+    client.add_connection_state_listener(states.append)
+    client.create_message_stream(DEFINITION)
+    start_outage(server, client)
+
+    with ThreadPoolExecutor(1) as executor:
+        streams = executor.submit(client.list_streams)
+        time.sleep(0.2)
+        assert not streams.done()
+        server.accepting = True
+        assert streams.result(timeout=5) == ['Readings']
+    assert states == [False, True]
+
+
+def test_failed_connect_does_not_keep_the_connection(server, caplog):
+    client = make_client(server, reconnect_initial_delay=1)
+    try:
+        start_outage(server, client)
+        wait_until(lambda: 'Unable to reconnect' in caplog.text)
+        assert client._StreamManagerClient__reader is None
+        assert client._StreamManagerClient__writer is None
+    finally:
+        client.close()
+
+
+def test_close_while_reconnecting_leaves_no_pending_task(server, caplog):
+    client = make_client(server)
+    start_outage(server, client)
+
+    with ThreadPoolExecutor(1) as executor:
+        streams = executor.submit(client.list_streams)
+        time.sleep(0.1)
+        client.close()
+        with pytest.raises(StreamManagerException):
+            streams.result(timeout=1)
+
+    client._StreamManagerClient__event_loop_thread.join(timeout=5)
+    del client
+    with caplog.at_level(logging.ERROR, logger='asyncio'):
+        gc.collect()
+    assert 'Task was destroyed' not in caplog.text
+
+
+def test_close_fails_requests_waiting_for_a_response(server, caplog):
+    client = make_client(server)
+    client.create_message_stream(DEFINITION)
+    server.hold = True
+
+    with ThreadPoolExecutor(1) as executor:
+        streams = executor.submit(client.list_streams)
+        wait_until(lambda: len(server.requests) == 2)
+        client.close()
+        with pytest.raises(StreamManagerException):
+            streams.result(timeout=1)
+
+    client._StreamManagerClient__event_loop_thread.join(timeout=5)
+    del client
+    with caplog.at_level(logging.ERROR, logger='asyncio'):
+        gc.collect()
+    assert 'Task was destroyed' not in caplog.text
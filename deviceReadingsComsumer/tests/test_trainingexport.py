@@ -0,0 +1,66 @@
+import gzip
+import json
+
+import trainingexport
+
+HOUR = 3600
+START = 1612000000 // HOUR * HOUR
+
+
+def read_series(result, out_path):
+    series = []
+    for shard in result['shards']:
+        with gzip.open(str(out_path / shard), 'rt') as f:
+            series.extend(json.loads(line) for line in f)
+    return series
+
+
+def export(readings, out_path, **kwargs):
+    kwargs.setdefault('partitions', 2)
+    kwargs.setdefault('workers', 1)
+    return trainingexport.export_training_data(readings, str(out_path), freq='H', **kwargs)
+
+
+def test_series_are_mean_capacity_per_bin_with_nan_gaps(tmp_path):
+    readings = [
+        ('bin-1', START, 10), ('bin-1', START + 60, 20),
+        ('bin-1', (START + 2 * HOUR) * 1000, 30),
+        ('bin-2', '2021-01-30T10:00:00Z', 5), ('bin-2', '2021-01-30T11:30:00Z', 7),
+    ]
+    result = export(readings, tmp_path)
+    assert (result['readings'], result['skipped'], result['dropped']) == (5, 0, 0)
+
+    series = sorted(read_series(result, tmp_path), key=lambda s: s['start'])
+    assert series == [
+        {'start': '2021-01-30 09:00:00', 'target': [15.0, 'NaN', 30.0]},
+        {'start': '2021-01-30 10:00:00', 'target': [5.0, 7.0]},
+    ]
+    with open(result['manifest']) as f:
+        assert json.load(f) == [{'prefix': trainingexport.MANIFEST_PREFIX}] + result['shards']
+
+
+def test_separators_in_fields_do_not_split_readings(tmp_path):
+    readings = [('bin\t1\n', START, 10), ('bin\t1\n', START + HOUR, '20\r\n'), ('bin,"2"', START, 1), ('bin,"2"', START + HOUR, 2)]
+    result = export(readings, tmp_path, partitions=1)
+    assert (result['readings'], result['skipped']) == (4, 0)
+    assert sorted(s['target'] for s in read_series(result, tmp_path)) == [[1.0, 2.0], [10.0, 20.0]]
+
+
+def test_malformed_readings_are_skipped(tmp_path):
+    readings = [
+        ('bin-1', START, 10), ('bin-1', START + HOUR, 20),
+        ('bin-1', START, 'full'), ('bin-1', START, float('nan')), ('bin-1', 'yesterday', 1),
+        ('bin-1', START, float('inf')), ('bin-1', START, '-inf'), ('bin-1', START, 'Infinity'),
+        ('bin-1', float('inf'), 1), ('bin-1', -HOUR, 1), ('bin-1', 1e300, 1),
+    ]
+    result = export(readings, tmp_path)
+    assert (result['readings'], result['skipped']) == (11, 9)
+    assert [s['target'] for s in read_series(result, tmp_path)] == [[10.0, 20.0]]
+
+
+def test_series_keep_only_their_most_recent_bins(tmp_path):
+    # A reading from a device whose clock was never set lies decades before the others
+    readings = [('bin-1', 0, 1)] + [('bin-1', START + i * HOUR, i) for i in range(10)]
+    result = export(readings, tmp_path, max_length=5)
+    assert result['dropped'] == 6
+    assert read_series(result, tmp_path) == [{'start': '2021-01-30 14:00:00', 'target': [5.0, 6.0, 7.0, 8.0, 9.0]}]
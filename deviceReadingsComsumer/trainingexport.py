@@ -0,0 +1,216 @@
+import os
+import re
+import csv
+import json
+import gzip
+import math
+import shutil
+import sqlite3
+import logging
+import tempfile
+import zlib
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+
+import edgedb
+
+# Readings of every device are exported as one DeepAR series of TRAINING_FREQ bins,
+# the same frequency modelTrainingTriggerHandler passes to training as time_freq
+TRAINING_FREQ = os.environ.get('TRAINING_FREQ', 'H')
+# Series with fewer bins than this are left out, DeepAR cannot train on them
+MIN_SERIES_LENGTH = int(os.environ.get('MIN_SERIES_LENGTH', 2))
+# Series are cut to their most recent bins beyond this, so that one reading with a far off
+# timestamp cannot make the series span years of "NaN" bins
+MAX_SERIES_LENGTH = int(os.environ.get('MAX_SERIES_LENGTH', 20000))
+
+# Readings are spilled to this many partition files, and each partition is turned into
+# one shard by a worker process, so a worker holds 1 / EXPORT_PARTITIONS of the readings
+EXPORT_PARTITIONS = int(os.environ.get('EXPORT_PARTITIONS', 16))
+EXPORT_WORKERS = int(os.environ.get('EXPORT_WORKERS', os.cpu_count() or 1))
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 5000))
+
+# The edge database has no readings table of its own, so the query is configurable.
+# It has to return the device name, timestamp and capacity of each reading
+READINGS_QUERY = os.environ.get('READINGS_QUERY', 'SELECT deviceName, timestamp, capacity FROM readings')
+
+# modelTrainingTriggerHandler reads the manifest from s3://<base>-training-data/data,
+# and the shards listed in it from MANIFEST_PREFIX
+MANIFEST_NAME = 'data'
+MANIFEST_PREFIX = os.environ.get('MANIFEST_PREFIX', 's3://smartcity-waste-management-garbage-level-training-data/shards/')
+
+# Readings dated before the epoch or after the year 9999 are taken to be malformed
+MAX_TIMESTAMP = 253402300799
+
+freq_regex = re.compile(r'^(\d*)(min|T|H|D)$')
+FREQ_UNIT_SECONDS = {'min': 60, 'T': 60, 'H': 3600, 'D': 86400}
+
+def freq_seconds(freq):
+    match = freq_regex.match(freq)
+    if match is None:
+        raise ValueError('Unsupported frequency %s' % freq)
+    return int(match.group(1) or 1) * FREQ_UNIT_SECONDS[match.group(2)]
+
+def parse_timestamp(value):
+    """Epoch seconds of a reading timestamp given in epoch seconds, epoch milliseconds or ISO 8601"""
+    try:
+        seconds = float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+    return seconds / 1000 if seconds > 1e11 else seconds
+
+def iter_db_readings(path=edgedb.DB_PATH, query=READINGS_QUERY, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Yield (device name, timestamp, capacity) rows of query, fetched batch_size at
+    a time over a read-only connection of its own, so the export neither holds
+    the whole table in memory nor blocks the handler's connection.
+    """
+    con = sqlite3.connect('file:%s?mode=ro' % path, uri=True)
+    try:
+        cur = con.execute(query)
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row
+    finally:
+        con.close()
+
+def iter_stream_readings(client, stream_name, start_sequence=0, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Yield (device name, timestamp, capacity) of the readings stored in a
+    StreamManager stream by ReadingStream, up to the end of the stream.
+    """
+    for message in client.iter_messages(stream_name, start_sequence, batch_size=batch_size, stop_at_end=True):
+        try:
+            reading = json.loads(message.payload.decode('utf-8'))
+            yield reading['deviceName'], reading['timestamp'], reading['capacity']
+        except (ValueError, KeyError) as e:
+            logging.error('Skipping malformed reading %d: %s', message.sequence_number, repr(e))
+
+def spill(readings, spill_path, partitions=EXPORT_PARTITIONS):
+    """
+    Write readings to partition files by a hash of the device name, so that every
+    reading of a device lands in the same partition. Returns the number of readings.
+    Fields are written as CSV with tab delimiters, so tabs and line breaks in any
+    of them are quoted rather than splitting the row.
+    """
+    files = [open(os.path.join(spill_path, 'part-%05d.tsv' % i), 'w', newline='') for i in range(partitions)]
+    writers = [csv.writer(f, delimiter='\t', lineterminator='\n') for f in files]
+    count = 0
+    try:
+        for device_name, timestamp, capacity in readings:
+            device_name = str(device_name)
+            writers[zlib.crc32(device_name.encode('utf-8')) % partitions].writerow((device_name, timestamp, capacity))
+            count += 1
+    finally:
+        for f in files:
+            f.close()
+    return count
+
+def build_series(readings, step, max_length=MAX_SERIES_LENGTH):
+    """
+    DeepAR series of one device: the mean capacity of every step-second bin from
+    the first reading's bin to the last, with "NaN" for bins without readings.
+    Only the last max_length bins are kept. Returns the series and the number of
+    readings left out for falling before them.
+    """
+    bins = {}
+    for timestamp, capacity in readings:
+        bin_sum = bins.setdefault(int(timestamp // step), [0.0, 0])
+        bin_sum[0] += capacity
+        bin_sum[1] += 1
+    first, last = min(bins), max(bins)
+    dropped = 0
+    if last - first >= max_length:
+        first = last - max_length + 1
+        dropped = sum(bin_sum[1] for b, bin_sum in bins.items() if b < first)
+    target = []
+    for b in range(first, last + 1):
+        bin_sum = bins.get(b)
+        target.append('NaN' if bin_sum is None else round(bin_sum[0] / bin_sum[1], 4))
+    start = datetime.fromtimestamp(first * step, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    return {'start': start, 'target': target}, dropped
+
+def export_partition(args):
+    """Turn one partition file into a gzip'd JSON Lines shard. Runs in a worker process."""
+    part_path, shard_path, step, min_length, max_length = args
+    devices = {}
+    skipped = 0
+    with open(part_path, newline='') as f:
+        for row in csv.reader(f, delimiter='\t'):
+            try:
+                device_name, timestamp, capacity = row
+                capacity = float(capacity)
+                if not math.isfinite(capacity):
+                    raise ValueError('Capacity is not finite')
+                timestamp = parse_timestamp(timestamp)
+                if not 0 <= timestamp <= MAX_TIMESTAMP:
+                    raise ValueError('Timestamp out of range')
+                devices.setdefault(device_name, []).append((timestamp, capacity))
+            except (ValueError, AttributeError) as e:
+                logging.error('Skipping malformed reading %r: %s', row, repr(e))
+                skipped += 1
+
+    series = 0
+    dropped = 0
+    with gzip.open(shard_path, 'wt', compresslevel=6) as f:
+        for device_name in sorted(devices):
+            s, device_dropped = build_series(devices[device_name], step, max_length)
+            if device_dropped:
+                logging.error('Left %d readings of %s out of its series, they are more than %d bins older than its last',
+                              device_dropped, device_name, max_length)
+                dropped += device_dropped
+            if len(s['target']) < min_length:
+                continue
+            # allow_nan=False, as JSON has no Infinity for DeepAR to parse
+            f.write(json.dumps(s, separators=(',', ':'), allow_nan=False))
+            f.write('\n')
+            series += 1
+    return {'shard': os.path.basename(shard_path), 'series': series, 'skipped': skipped, 'dropped': dropped}
+
+def export_training_data(readings, out_path, freq=TRAINING_FREQ, min_length=MIN_SERIES_LENGTH, max_length=MAX_SERIES_LENGTH,
+                         partitions=EXPORT_PARTITIONS, workers=EXPORT_WORKERS, manifest_prefix=MANIFEST_PREFIX):
+    """
+    Export an iterable of (device name, timestamp, capacity) readings as DeepAR
+    training data in out_path: one gzip'd JSON Lines shard per partition holding
+    one series per device, and a SageMaker manifest listing the non-empty shards
+    under manifest_prefix. Only one batch of readings is in memory while
+    spilling, and each worker process holds a single partition.
+    """
+    step = freq_seconds(freq)
+    os.makedirs(out_path, exist_ok=True)
+    spill_path = tempfile.mkdtemp(prefix='.spill-', dir=out_path)
+    try:
+        count = spill(readings, spill_path, partitions)
+        jobs = [
+            (os.path.join(spill_path, 'part-%05d.tsv' % i), os.path.join(out_path, 'train-%05d.jsonl.gz' % i), step,
+             min_length, max_length)
+            for i in range(partitions)
+        ]
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                shards = list(executor.map(export_partition, jobs))
+        else:
+            shards = [export_partition(job) for job in jobs]
+    finally:
+        shutil.rmtree(spill_path, ignore_errors=True)
+
+    for shard in shards:
+        if not shard['series']:
+            os.remove(os.path.join(out_path, shard['shard']))
+    shard_names = [shard['shard'] for shard in shards if shard['series']]
+    with open(os.path.join(out_path, MANIFEST_NAME), 'w') as f:
+        json.dump([{'prefix': manifest_prefix}] + shard_names, f)
+
+    return {
+        'readings': count,
+        'skipped': sum(shard['skipped'] for shard in shards),
+        'dropped': sum(shard['dropped'] for shard in shards),
+        'series': sum(shard['series'] for shard in shards),
+        'shards': shard_names,
+        'manifest': os.path.join(out_path, MANIFEST_NAME),
+    }
@@ -5,6 +5,13 @@
 import base64
 import json
 import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache, wraps
+from queue import Queue
 
 from greengrasssdk import Lambda
 from greengrass_common.env_vars import SHADOW_FUNCTION_ARN, ROUTER_FUNCTION_ARN, MY_FUNCTION_ARN
@@ -17,13 +24,145 @@ customer_logger = logging.getLogger(__name__)
 customer_logger.propagate = True
 
 
+# Number of (topic, queueFullPolicy) pairs whose encoded client context is kept
+CLIENT_CONTEXT_CACHE_SIZE = 1024
+
+# Number of messages publish_async() buffers before it blocks the caller
+PUBLISH_QUEUE_SIZE = 1000
+
+# Number of messages publish_many() hands to Greengrass Core at the same time
+PUBLISH_MANY_IN_FLIGHT = 4
+
+# Number of things whose shadow document is kept when the shadow cache is enabled
+SHADOW_CACHE_SIZE = 256
+
+shadow_documents_topic_regex = re.compile(r'^\$aws/things/([^/]+)/shadow/update/documents$')
+
+
 class ShadowError(Exception):
     pass
 
 
+class ShadowCache:
+    """
+    Size-bounded LRU cache of shadow documents with a per-entry TTL.
+
+    Every entry remembers the version of its document, so a notification about a version which is not newer
+    than the cached one leaves the entry in place. Documents fetched while an invalidation happened are not
+    cached, as they may predate the change that caused it.
+    """
+    def __init__(self, ttl, max_size=SHADOW_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, thing_name):
+        with self._lock:
+            entry = self._entries.get(thing_name)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[thing_name]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(thing_name)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, thing_name, payload, invalidations):
+        """
+        Cache the shadow document of a thing, unless the cache was invalidated since invalidations was read.
+        """
+        try:
+            version = json.loads(payload.decode('utf-8')).get('version')
+        except (ValueError, AttributeError):
+            return
+        with self._lock:
+            if invalidations != self.invalidations:
+                return
+            self._entries[thing_name] = (time.monotonic() + self.ttl, version, payload)
+            self._entries.move_to_end(thing_name)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, thing_name=None, version=None):
+        """
+        Drop the cached document of a thing, or of every thing if thing_name is None. If version is given,
+        the document is only dropped if it is older than that version.
+        """
+        with self._lock:
+            if thing_name is None:
+                self._entries.clear()
+            else:
+                entry = self._entries.get(thing_name)
+                if version is not None and entry is not None and entry[1] is not None and entry[1] >= version:
+                    return
+                self._entries.pop(thing_name, None)
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': self.hits / lookups if lookups else 0.0,
+                'missRate': self.misses / lookups if lookups else 0.0,
+            }
+
+
+@lru_cache(maxsize=CLIENT_CONTEXT_CACHE_SIZE)
+def _encode_publish_client_context(topic, queue_full_policy):
+    client_context = {
+        'custom': {
+            'source': MY_FUNCTION_ARN,
+            'subject': topic
+        }
+    }
+
+    if queue_full_policy == 'AllOrException':
+        client_context['custom']['queueFullPolicy'] = 'AllOrError'
+    elif queue_full_policy in ['BestEffort', '']:
+        client_context['custom']['queueFullPolicy'] = queue_full_policy
+    else:
+        raise ValueError('Invalid value for queueFullPolicy: {queueFullPolicy}'.format(
+            queueFullPolicy=queue_full_policy
+        ))
+
+    return base64.b64encode(json.dumps(client_context).encode())
+
+
 class Client:
-    def __init__(self):
+    def __init__(self,
+                 publish_queue_size=PUBLISH_QUEUE_SIZE,
+                 publish_many_in_flight=PUBLISH_MANY_IN_FLIGHT,
+                 shadow_cache_ttl=0,
+                 shadow_cache_size=SHADOW_CACHE_SIZE):
+        """
+        :param publish_queue_size: Number of messages publish_async buffers before it blocks the caller.
+        :type publish_queue_size: int
+
+        :param publish_many_in_flight: Number of messages publish_many hands to Greengrass Core at the same time.
+        :type publish_many_in_flight: int
+
+        :param shadow_cache_ttl: Seconds for which get_thing_shadow serves a shadow document from memory.
+            The cache is disabled if 0.
+        :type shadow_cache_ttl: float
+
+        :param shadow_cache_size: Number of things whose shadow document is cached.
+        :type shadow_cache_size: int
+        """
         self.lambda_client = Lambda.Client()
+        self.shadow_cache = ShadowCache(shadow_cache_ttl, shadow_cache_size) if shadow_cache_ttl > 0 else None
+        self._publish_queue = Queue(maxsize=publish_queue_size)
+        self._publish_thread = None
+        self._publish_thread_lock = threading.Lock()
+        self._publish_many_in_flight = publish_many_in_flight
+        self._publish_many_executor = None
 
     def get_thing_shadow(self, **kwargs):
         r"""
@@ -42,7 +181,18 @@ class Client:
         thing_name = self._get_required_parameter('thingName', **kwargs)
         payload = b''
 
-        return self._shadow_op('get', thing_name, payload)
+        cache = self.shadow_cache
+        if cache is None:
+            return self._shadow_op('get', thing_name, payload)
+
+        cached_payload = cache.get(thing_name)
+        if cached_payload is not None:
+            return {'payload': cached_payload}
+
+        invalidations = cache.invalidations
+        response = self._shadow_op('get', thing_name, payload)
+        cache.put(thing_name, response['payload'], invalidations)
+        return response
 
     def update_thing_shadow(self, **kwargs):
         r"""
@@ -64,7 +214,10 @@ class Client:
         thing_name = self._get_required_parameter('thingName', **kwargs)
         payload = self._get_required_parameter('payload', **kwargs)
 
-        return self._shadow_op('update', thing_name, payload)
+        try:
+            return self._shadow_op('update', thing_name, payload)
+        finally:
+            self._invalidate_shadow(thing_name)
 
     def delete_thing_shadow(self, **kwargs):
         r"""
@@ -83,7 +236,40 @@ class Client:
         thing_name = self._get_required_parameter('thingName', **kwargs)
         payload = b''
 
-        return self._shadow_op('delete', thing_name, payload)
+        try:
+            return self._shadow_op('delete', thing_name, payload)
+        finally:
+            self._invalidate_shadow(thing_name)
+
+    def handle_shadow_documents(self, event, context):
+        r"""
+        Keeps the shadow cache up to date with changes made by other devices and functions. Call it from the
+        handler of a Lambda function subscribed to ``$aws/things/<thingName>/shadow/update/documents``: the
+        cached document of the thing is dropped if the notification carries a newer version.
+
+        :param event: The event the handler was invoked with.
+        :param context: The context the handler was invoked with.
+
+        :returns: (``bool``) --
+            Whether the event was a shadow documents notification.
+        """
+        try:
+            subject = context.client_context.custom['subject']
+        except (AttributeError, KeyError, TypeError):
+            return False
+
+        match = shadow_documents_topic_regex.match(subject)
+        if match is None:
+            return False
+
+        current = event.get('current') if isinstance(event, dict) else None
+        version = current.get('version') if isinstance(current, dict) else None
+        self._invalidate_shadow(match.group(1), version)
+        return True
+
+    def _invalidate_shadow(self, thing_name, version=None):
+        if self.shadow_cache is not None:
+            self.shadow_cache.invalidate(thing_name, version)
 
     def publish(self, **kwargs):
         r"""
@@ -100,37 +286,126 @@ class Client:
         :returns: None
         """
 
+        topic, payload, client_context = self._get_publish_parameters(**kwargs)
+        self._publish(topic, payload, client_context)
+
+    def publish_many(self, topic, payloads, queueFullPolicy=''):
+        r"""
+        Publishes several messages on the same topic. The client context is encoded once for the whole batch,
+        and up to publish_many_in_flight messages are handed to Greengrass Core at the same time, so messages
+        in flight together may reach subscribers out of order. Create the client with publish_many_in_flight=1
+        to publish them one after the other. A message that fails does not stop the rest of the batch.
+
+        :param topic: The name of the MQTT topic.
+        :type topic: str
+
+        :param payloads: The messages to publish.
+        :type payloads: iterable of bytes or seekable file-like objects
+
+        :param queueFullPolicy: The policy for GGC to take when its internal queue is full
+        :type queueFullPolicy: str
+
+        :returns: (``list``) --
+            One entry per message, in the order of payloads: None if it was published, or the exception
+            publishing it failed with.
+        """
+        client_context = _encode_publish_client_context(topic, queueFullPolicy)
+
+        def publish(payload):
+            try:
+                self._publish(topic, payload, client_context)
+            except Exception as e:
+                return e
+            return None
+
+        if self._publish_many_in_flight <= 1:
+            return [publish(payload) for payload in payloads]
+        return list(self._get_publish_many_executor().map(publish, payloads))
+
+    def publish_async(self, **kwargs):
+        r"""
+        Queues state information to be published by a background thread, and returns without waiting for it
+        to be handed to Greengrass Core. Messages are published in the order they were queued. The caller blocks
+        only while the queue is full.
+
+        Takes the same keyword arguments as :meth:`publish`. Invalid arguments raise right away.
+
+        :returns: (``concurrent.futures.Future``) --
+            Resolves to None once the message was published, or raises the exception publishing it failed with.
+        """
+        topic, payload, client_context = self._get_publish_parameters(**kwargs)
+
+        future = Future()
+        self._ensure_publish_thread()
+        self._publish_queue.put((future, topic, payload, client_context))
+        return future
+
+    def flush(self):
+        """
+        Blocks until every message queued by :meth:`publish_async` has been published.
+        """
+        self._publish_queue.join()
+
+    def flush_on_return(self, handler):
+        """
+        Decorates a Lambda function handler so that messages it queued with :meth:`publish_async` are published
+        before it returns. An on-demand Lambda container may be frozen as soon as its handler returns, so
+        messages still in the queue at that point would only go out on its next invocation.
+        """
+        @wraps(handler)
+        def flushing_handler(*args, **kwargs):
+            try:
+                return handler(*args, **kwargs)
+            finally:
+                self.flush()
+        return flushing_handler
+
+    def _get_publish_parameters(self, **kwargs):
         topic = self._get_required_parameter('topic', **kwargs)
 
         # payload and queueFullPolicy are optional parameters
         payload = kwargs.get('payload', b'')
         queue_full_policy = kwargs.get('queueFullPolicy', '')
 
-        function_arn = ROUTER_FUNCTION_ARN
-        client_context = {
-            'custom': {
-                'source': MY_FUNCTION_ARN,
-                'subject': topic
-            }
-        }
+        # The client context only depends on the topic and queueFullPolicy, so it is encoded once per pair
+        return topic, payload, _encode_publish_client_context(topic, queue_full_policy)
 
-        if queue_full_policy == 'AllOrException':
-            client_context['custom']['queueFullPolicy'] = 'AllOrError'
-        elif queue_full_policy in ['BestEffort', '']:
-            client_context['custom']['queueFullPolicy'] = queue_full_policy
-        else:
-            raise ValueError('Invalid value for queueFullPolicy: {queueFullPolicy}'.format(
-                queueFullPolicy=queue_full_policy
-            ))
-
-        customer_logger.debug('Publishing message on topic "{}" with Payload "{}"'.format(topic, payload))
+    def _publish(self, topic, payload, client_context):
+        customer_logger.debug('Publishing message on topic "%s" with Payload "%s"', topic, payload)
         self.lambda_client._invoke_internal(
-            function_arn,
+            ROUTER_FUNCTION_ARN,
             payload,
-            base64.b64encode(json.dumps(client_context).encode()),
+            client_context,
             'Event'
         )
 
+    def _get_publish_many_executor(self):
+        with self._publish_thread_lock:
+            if self._publish_many_executor is None:
+                self._publish_many_executor = ThreadPoolExecutor(max_workers=self._publish_many_in_flight)
+            return self._publish_many_executor
+
+    def _ensure_publish_thread(self):
+        with self._publish_thread_lock:
+            if self._publish_thread is None or not self._publish_thread.is_alive():
+                self._publish_thread = threading.Thread(target=self._publish_worker, daemon=True)
+                self._publish_thread.start()
+
+    def _publish_worker(self):
+        while True:
+            future, topic, payload, client_context = self._publish_queue.get()
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        self._publish(topic, payload, client_context)
+                    except Exception as e:
+                        customer_logger.exception(e)
+                        future.set_exception(e)
+                    else:
+                        future.set_result(None)
+            finally:
+                self._publish_queue.task_done()
+
     def _get_required_parameter(self, parameter_name, **kwargs):
         if parameter_name not in kwargs:
             raise ValueError('Parameter "{parameter_name}" is a required parameter but was not provided.'.format(
@@ -147,7 +422,7 @@ class Client:
             }
         }
 
-        customer_logger.debug('Calling shadow service on topic "{}" with payload "{}"'.format(topic, payload))
+        customer_logger.debug('Calling shadow service on topic "%s" with payload "%s"', topic, payload)
         response = self.lambda_client._invoke_internal(
             function_arn,
             payload,
@@ -160,7 +435,8 @@ class Client:
             ))
 
         payload = response['Payload'].read()
-        if response:
+        # Only error responses are decoded; a document without both keys anywhere cannot be one
+        if b'"code"' in payload and b'"message"' in payload:
             response_payload_map = json.loads(payload.decode('utf-8'))
             if 'code' in response_payload_map and 'message' in response_payload_map:
                 raise ShadowError('Request for shadow state returned error code {} with message "{}"'.format(
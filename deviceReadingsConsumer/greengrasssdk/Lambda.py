@@ -5,7 +5,7 @@
 import logging
 import re
 
-from io import BytesIO
+from functools import lru_cache
 
 from greengrass_common.function_arn_fields import FunctionArnFields
 from greengrass_ipc_python_sdk.ipc_client import IPCClient, IPCException
@@ -20,6 +20,41 @@ customer_logger.propagate = True
 
 valid_base64_regex = '^([A-Za-z0-9+/]{4})*([A-Za-z0-9+/]{4}|[A-Za-z0-9+/]{3}=|[A-Za-z0-9+/]{2}==)$'
 
+# Matches the same strings as valid_base64_regex once the length is known to be a multiple of 4,
+# in a single pass without backtracking
+base64_alphabet_regex = re.compile('[A-Za-z0-9+/]*={0,2}')
+
+# Number of (FunctionName, Qualifier) pairs whose resolved function ARN is kept
+FUNCTION_ARN_CACHE_SIZE = 256
+
+
+def _is_base64(s):
+    # '$' in valid_base64_regex also matches before a trailing newline, as base64.encodebytes() leaves one
+    if s.endswith('\n'):
+        s = s[:-1]
+    return len(s) > 0 and len(s) % 4 == 0 and base64_alphabet_regex.fullmatch(s) is not None
+
+
+@lru_cache(maxsize=FUNCTION_ARN_CACHE_SIZE)
+def _resolve_function_arn(function_name, qualifier):
+    arn_fields = FunctionArnFields(function_name)
+    arn_qualifier = arn_fields.qualifier
+
+    # A Function qualifier can be provided as part of the ARN in FunctionName, or it can be provided here. The
+    # behavior of the cloud is to throw an exception if both are specified but not equal
+    if qualifier and arn_qualifier and arn_qualifier != qualifier:
+        raise ValueError('The derived qualifier from the function name does not match the specified qualifier.')
+
+    final_qualifier = arn_qualifier if arn_qualifier else qualifier
+
+    try:
+        # GGC v1.9.0 or newer
+        return FunctionArnFields.build_function_arn(arn_fields.unqualified_arn, final_qualifier)
+    except AttributeError:
+        # older GGC version
+        raise AttributeError('class FunctionArnFields has no attribute \'build_function_arn\'. build_function_arn '
+                             'is introduced in GGC v1.9.0. Please check your GGC version.')
+
 
 class InvocationException(Exception):
     pass
@@ -70,31 +105,39 @@ class Client:
               In the event of a function error this field contains a message describing the error.
         """
 
+        function_arn, client_context, invocation_type = self._plan_invocation(**kwargs)
+
+        # Payload is an optional parameter
+        payload = kwargs.get('Payload', b'')
+        customer_logger.debug('Invoking local lambda "%s" with payload "%s" and client context "%s"',
+                              function_arn, payload, client_context)
+
+        # Post the work to IPC and return the result of that work
+        return self._invoke_internal(function_arn, payload, client_context, invocation_type)
+
+    def prepare(self, **kwargs):
+        r"""
+        Resolves and validates the invocation of a Lambda function once, for functions which are invoked
+        repeatedly with the same parameters.
+
+        :Keyword Arguments:
+            Same as :meth:`invoke`, except *Payload*, which is given to each invocation instead.
+
+        :returns: (``PreparedInvocation``) --
+            Its ``invoke(Payload=b'')`` method invokes the function and returns the same as :meth:`invoke`,
+            without parsing the function name or validating the client context again.
+        """
+        return PreparedInvocation(self, *self._plan_invocation(**kwargs))
+
+    def _plan_invocation(self, **kwargs):
         # FunctionName is a required parameter
         if 'FunctionName' not in kwargs:
             raise ValueError(
                 '"FunctionName" argument of Lambda.Client.invoke is a required argument but was not provided.'
             )
 
-        arn_fields = FunctionArnFields(kwargs['FunctionName'])
-        arn_qualifier = arn_fields.qualifier
-
-        # A Function qualifier can be provided as part of the ARN in FunctionName, or it can be provided here. The
-        # behavior of the cloud is to throw an exception if both are specified but not equal
-        extraneous_qualifier = kwargs.get('Qualifier', '')
-
-        if extraneous_qualifier and arn_qualifier and arn_qualifier != extraneous_qualifier:
-            raise ValueError('The derived qualifier from the function name does not match the specified qualifier.')
-
-        final_qualifier = arn_qualifier if arn_qualifier else extraneous_qualifier
-
-        try:
-            # GGC v1.9.0 or newer
-            function_arn = FunctionArnFields.build_function_arn(arn_fields.unqualified_arn, final_qualifier)
-        except AttributeError:
-            # older GGC version
-            raise AttributeError('class FunctionArnFields has no attribute \'build_function_arn\'. build_function_arn '
-                                 'is introduced in GGC v1.9.0. Please check your GGC version.')
+        # ARNs are resolved once per (FunctionName, Qualifier)
+        function_arn = _resolve_function_arn(kwargs['FunctionName'], kwargs.get('Qualifier', ''))
 
         # ClientContext must be base64 if given, but is an option parameter
         try:
@@ -106,17 +149,11 @@ class Client:
             )
 
         if client_context:
-            if not re.match(valid_base64_regex, client_context):
+            if not _is_base64(client_context):
                 raise ValueError('"ClientContext" argument of Lambda.Client.invoke must be base64 encoded.')
 
-        # Payload is an optional parameter
-        payload = kwargs.get('Payload', b'')
         invocation_type = kwargs.get('InvocationType', 'RequestResponse')
-        customer_logger.debug('Invoking local lambda "{}" with payload "{}" and client context "{}"'.format(
-            function_arn, payload, client_context))
-
-        # Post the work to IPC and return the result of that work
-        return self._invoke_internal(function_arn, payload, client_context, invocation_type)
+        return function_arn, client_context, invocation_type
 
     @mock
     def _invoke_internal(self, function_arn, payload, client_context, invocation_type="RequestResponse"):
@@ -125,7 +162,7 @@ class Client:
         give this Lambda client a raw payload/client context to invoke with, rather than having it built for them.
         This lets you include custom ExtensionMap_ values like subject which are needed for our internal pinned Lambdas.
         """
-        customer_logger.debug('Invoking Lambda function "{}" with Greengrass Message "{}"'.format(function_arn, payload))
+        customer_logger.debug('Invoking Lambda function "%s" with Greengrass Message "%s"', function_arn, payload)
 
         try:
             invocation_id = self.ipc.post_work(function_arn, payload, client_context, invocation_type)
@@ -150,22 +187,91 @@ class Client:
             raise InvocationException('Failed to invoke function due to ' + str(e))
 
 
+class PreparedInvocation(object):
+    """Invocation of a Lambda function whose name, qualifier, client context and invocation type were already
+    resolved and validated by :meth:`Client.prepare`.
+    """
+    def __init__(self, client, function_arn, client_context, invocation_type):
+        self.client = client
+        self.function_arn = function_arn
+        self.client_context = client_context
+        self.invocation_type = invocation_type
+
+    def invoke(self, Payload=b''):
+        """
+        Invokes the prepared Lambda function with the given payload.
+        Returns the same as :meth:`Client.invoke`.
+        """
+        return self.client._invoke_internal(self.function_arn, Payload, self.client_context, self.invocation_type)
+
+
 class StreamingBody(object):
     """Wrapper class for http response payload
 
     This provides a consistent interface to AWS Lambda Python SDK
+
+    The payload is read through a memoryview rather than copied into a stream, so reading the whole body at once
+    returns the payload itself and readinto() fills a caller's buffer straight from it.
     """
+    _DEFAULT_CHUNK_SIZE = 1024
+
     def __init__(self, payload):
-        self._raw_stream = BytesIO(payload)
+        self._payload = payload
+        self._view = memoryview(payload)
+        self._position = 0
         self._amount_read = 0
 
     def read(self, amt=None):
         """Read at most amt bytes from the stream.
         If the amt argument is omitted, read all data.
         """
-        chunk = self._raw_stream.read(amt)
+        start = self._position
+        end = len(self._view) if amt is None or amt < 0 else min(start + amt, len(self._view))
+        if start == 0 and end == len(self._view) and type(self._payload) is bytes:
+            chunk = self._payload
+        else:
+            chunk = self._view[start:end].tobytes()
+        self._position = end
         self._amount_read += len(chunk)
         return chunk
 
+    def readinto(self, b):
+        """Read bytes into a pre-allocated, writable bytes-like object b.
+        Returns the number of bytes read, 0 once the stream is exhausted.
+        """
+        start = self._position
+        with memoryview(b) as target:
+            amt = min(target.nbytes, len(self._view) - start)
+            target.cast('B')[:amt] = self._view[start:start + amt]
+        self._position = start + amt
+        self._amount_read += amt
+        return amt
+
+    def iter_chunks(self, chunk_size=_DEFAULT_CHUNK_SIZE):
+        """Return an iterator to yield chunks of chunk_size bytes from the stream.
+        """
+        while True:
+            chunk = self.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def iter_lines(self, keepends=False):
+        """Return an iterator to yield the lines of the stream, split on newline bytes.
+        """
+        while self._position < len(self._view):
+            start = self._position
+            newline = self._payload.find(b'\n', start)
+            end = len(self._view) if newline == -1 else newline + 1
+            line = self._view[start:end].tobytes()
+            self._position = end
+            self._amount_read += len(line)
+            if not keepends:
+                line = line[:-2] if line.endswith(b'\r\n') else line.rstrip(b'\n')
+            yield line
+
+    def __iter__(self):
+        return self.iter_chunks()
+
     def close(self):
-        self._raw_stream.close()
+        self._view.release()
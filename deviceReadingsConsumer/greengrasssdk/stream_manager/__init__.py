@@ -1,7 +1,7 @@
 # Export public facing objects
 # flake8: noqa
 
-from .streammanagerclient import StreamManagerClient
+from .streammanagerclient import SharedStreamManagerClient, StreamManagerClient
 from .exceptions import *
 from .util import Util
 from .data import (
@@ -1,8 +1,9 @@
 import asyncio
+import concurrent.futures
 import logging
 import os
-from threading import Thread
-from typing import List, Optional
+from threading import Lock, Thread
+from typing import AsyncIterator, Callable, Iterable, Iterator, List, Optional, Union
 
 import cbor2
 
@@ -33,7 +34,15 @@ from .data import (
     UpdateMessageStreamResponse,
     VersionInfo,
 )
-from .exceptions import ClientException, ConnectFailedException, StreamManagerException, ValidationException
+from .codec import Codec
+from .exceptions import (
+    ClientException,
+    ConnectFailedException,
+    NotEnoughMessagesException,
+    ResponsePayloadTooLargeException,
+    StreamManagerException,
+    ValidationException,
+)
 from .utilinternal import UtilInternal
 
 
@@ -46,6 +55,9 @@ class StreamManagerClient:
     :param connect_timeout: The timeout in seconds for connecting to the server. Default is 3 seconds.
     :param request_timeout: The timeout in seconds for all operations. Default is 60 seconds.
     :param logger: A logger to use for client logging. Default is Python's builtin logger.
+    :param reconnect_initial_delay: The delay in seconds before retrying to reconnect after the connection was lost.
+        Doubles after every failed attempt. Default is 0.1 seconds.
+    :param reconnect_max_delay: The maximum delay in seconds between attempts to reconnect. Default is 10 seconds.
 
     :raises: :exc:`~.exceptions.StreamManagerException` and subtypes if authenticating to the server fails.
     :raises: :exc:`asyncio.TimeoutError` if the request times out.
@@ -63,6 +75,31 @@ class StreamManagerClient:
 
     __CONNECT_VERSION = 1
 
+    # Response operations which answer a pending request, and the type their payload is decoded into
+    __RESPONSE_TYPES = {
+        Operation.ReadMessagesResponse: ReadMessagesResponse,
+        Operation.CreateMessageStreamResponse: CreateMessageStreamResponse,
+        Operation.DeleteMessageStreamResponse: DeleteMessageStreamResponse,
+        Operation.UpdateMessageStreamResponse: UpdateMessageStreamResponse,
+        Operation.AppendMessageResponse: AppendMessageResponse,
+        Operation.ListStreamsResponse: ListStreamsResponse,
+        Operation.DescribeMessageStreamResponse: DescribeMessageStreamResponse,
+        Operation.UnknownOperationError: UnknownOperationError,
+    }
+
+    # Responses which can carry megabytes of message payloads are never logged in full
+    __UNLOGGED_RESPONSE_TYPES = (ReadMessagesResponse,)
+
+    # Requests which are safe to send again on a new connection if the connection was lost before their response
+    # arrived. Any other request in flight fails with ConnectionError, as the server may already have applied it.
+    __REPLAYABLE_OPERATIONS = frozenset(
+        [Operation.ReadMessages, Operation.ListStreams, Operation.DescribeMessageStream]
+    )
+
+    # Payload bytes that iter_messages aims to fetch per read, so that responses stay well below the
+    # size at which the server answers with ResponsePayloadTooLarge
+    __ITER_MAX_BATCH_BYTES = 4 * 1024 * 1024
+
     def __init__(
         self,
         host="127.0.0.1",
@@ -70,14 +107,19 @@ class StreamManagerClient:
         connect_timeout=3,
         request_timeout=60,
         logger=logging.getLogger("StreamManagerClient"),
+        reconnect_initial_delay=0.1,
+        reconnect_max_delay=10,
     ):
         self.host = host
         if port is None:
             port = int(os.getenv("STREAM_MANAGER_SERVER_PORT", 8088))
         self.port = port
         self.__requests = {}
+        self.__replayable_requests = {}
         self.connect_timeout = connect_timeout
         self.request_timeout = request_timeout
+        self.reconnect_initial_delay = reconnect_initial_delay
+        self.reconnect_max_delay = reconnect_max_delay
         self.logger = logger
         self.auth_token = os.getenv("AWS_CONTAINER_AUTHORIZATION_TOKEN")
 
@@ -90,6 +132,15 @@ class StreamManagerClient:
         self.__closed = False
         self.__reader = None
         self.__writer = None
+        self.__drain_task = None
+        self.__connect_task = None
+        # Resolved once the connection is back, while the client is reconnecting
+        self.__reconnected = None
+        # Tasks the client runs on its loop, cancelled when it is closed
+        self.__tasks = set()
+        # Requests in progress, which closing the client fails and waits for
+        self.__callers = set()
+        self.__connection_state_listeners = []
 
         # Defines a function to be run in a separate thread to run the event loop
         # this enables our synchronous interface without locks
@@ -107,19 +158,54 @@ class StreamManagerClient:
         UtilInternal.sync(self.__connect(), loop=self.__loop)
 
     async def _close(self):
-        if self.__writer is not None:
-            self.__closed = True
-            self.connected = False
-            self.__reader = None
+        self.__closed = True
+        self.connected = False
+        writer = self.__writer
+        if writer is not None:
             # Drain any existing data waiting to be sent
-            await self.__writer.drain()
-            self.__writer.close()
+            try:
+                await self.__drain()
+            except ConnectionError:
+                pass
+
+        # Stop the read loop, reconnect attempts and prefetches, so that no task is left pending on the loop
+        current = asyncio.current_task(loop=self.__loop)
+        tasks = [task for task in self.__tasks if task is not current]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        # Requests still waiting for a response, or for the connection to come back, fail right away
+        for future in self.__requests.values():
+            if not future.done():
+                future.set_exception(StreamManagerException("Client is closed. Create a new client first."))
+        if self.__reconnected is not None and not self.__reconnected.done():
+            self.__reconnected.set_result(None)
+        # and are let finish before the loop is stopped
+        callers = [caller for caller in self.__callers if caller is not current]
+        await asyncio.gather(*callers, return_exceptions=True)
+
+        self.__reader = None
+        self.__writer = None
+        if writer is not None:
+            writer.close()
             try:
                 # Only added in Python 3.7, so try to call it, but otherwise just skip it
-                await self.__writer.wait_closed()
-            except AttributeError:
+                await writer.wait_closed()
+            except (AttributeError, ConnectionError):
                 pass
-            self.__writer = None
+
+    def __create_task(self, coro):
+        task = self.__loop.create_task(coro)
+        self.__tasks.add(task)
+        task.add_done_callback(self.__tasks.discard)
+        return task
+
+    def __discard_connection(self):
+        if self.__writer is not None:
+            self.__writer.close()
+        self.__reader = None
+        self.__writer = None
 
     def __check_closed(self):
         if self.__closed:
@@ -131,40 +217,123 @@ class StreamManagerClient:
             return
         try:
             self.logger.debug("Opening connection to %s:%d", self.host, self.port)
-            future = asyncio.open_connection(self.host, self.port, loop=self.__loop)
+            future = asyncio.open_connection(self.host, self.port)
             self.__reader, self.__writer = await asyncio.wait_for(
-                future, timeout=self.connect_timeout, loop=self.__loop
+                future, timeout=self.connect_timeout
             )
 
-            await asyncio.wait_for(self.__connect_request_response(), timeout=self.request_timeout, loop=self.__loop)
+            await asyncio.wait_for(self.__connect_request_response(), timeout=self.request_timeout)
 
             self.logger.debug("Socket connected successfully. Starting read loop.")
             self.connected = True
-            self.__loop.create_task(self.__read_loop())
-        except ConnectionError as e:
-            self.logger.error("Connection error while connecting to server: %s", e)
+            self.__create_task(self.__read_loop())
+        except BaseException as e:
+            # Whatever failed, the half-open connection is not used again
+            self.__discard_connection()
+            if isinstance(e, ConnectionError):
+                self.logger.error("Connection error while connecting to server: %s", e)
             raise
+        self.__notify_connection_state(True)
+
+    async def __ensure_connected(self):
+        # Callers which find the client disconnected share a single connection attempt
+        if self.connected:
+            return
+        if self.__connect_task is None or self.__connect_task.done():
+            self.__connect_task = self.__create_task(self.__connect())
+        await asyncio.shield(self.__connect_task)
+
+    async def __wait_connected(self):
+        # Requests made while the client is reconnecting wait for the connection to come back, within their own
+        # timeout, rather than failing on the lost connection or racing the reconnect with attempts of their own
+        while not self.connected:
+            self.__check_closed()
+            if self.__reconnected is not None and not self.__reconnected.done():
+                await asyncio.shield(self.__reconnected)
+            else:
+                await self.__ensure_connected()
+
+    def __connection_lost(self):
+        self.connected = False
+        self.__discard_connection()
+        if self.__reconnected is None or self.__reconnected.done():
+            self.__reconnected = self.__loop.create_future()
+
+        # Fail what cannot be sent again right away, rather than letting it wait out the request timeout
+        for request_id, future in self.__requests.items():
+            if request_id not in self.__replayable_requests and not future.done():
+                future.set_exception(ConnectionError("Connection to the server was lost while waiting for a response"))
+
+        self.__notify_connection_state(False)
+
+    async def __reconnect(self):
+        delay = self.reconnect_initial_delay
+        while not self.__closed:
+            try:
+                await self.__ensure_connected()
+            except Exception as e:
+                if self.__closed:
+                    return
+                self.logger.error("Unable to reconnect to server, retrying in %.1f seconds: %r", delay, e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.reconnect_max_delay)
+                continue
+
+            # Send the requests which were still waiting for a response again, on the new connection
+            replayed = 0
+            for request_id, (operation, data) in list(self.__replayable_requests.items()):
+                future = self.__requests.get(request_id)
+                if future is not None and not future.done():
+                    self.__write_request(operation, data)
+                    replayed += 1
+            if replayed:
+                self.logger.info("Reconnected to server, sending %d request(s) again", replayed)
+            # Let the requests which waited for the connection go
+            if self.__reconnected is not None and not self.__reconnected.done():
+                self.__reconnected.set_result(None)
+            if replayed:
+                try:
+                    await self.__drain()
+                except ConnectionError:
+                    # Lost again already, the new read loop reconnects and replays them once more
+                    pass
+            return
+
+    def __notify_connection_state(self, connected):
+        for listener in list(self.__connection_state_listeners):
+            try:
+                listener(connected)
+            except Exception:
+                self.logger.exception("Connection state listener raised an exception")
+
+    def __write_request(self, operation, data):
+        for chunk in Codec.encode_request(operation, data):
+            self.__writer.write(chunk)
+
+    async def __drain(self):
+        # Requests in flight share a single drain, so frames written back to back are flushed together.
+        # StreamWriter.drain() also does not support concurrent waiters before Python 3.10.
+        if self.__drain_task is None or self.__drain_task.done():
+            self.__drain_task = self.__create_task(self.__writer.drain())
+        await asyncio.shield(self.__drain_task)
+
+    def __resolve(self, request_id, response):
+        future = self.__requests.get(request_id)
+        if future is not None and not future.done():
+            future.set_result(response)
 
     def __log_trace(self, *args, **kwargs):
         self.logger.log(5, *args, **kwargs)
 
     async def __read_message_frame(self):
-        length_bytes = await self.__reader.read(n=4)
-        if len(length_bytes) == 0:
-            raise asyncio.IncompleteReadError(length_bytes, 4)
-
-        length = UtilInternal.int_from_bytes(length_bytes)
-        operation = UtilInternal.int_from_bytes(await self.__reader.read(n=1))
-
-        # Read from the socket until we have read the full packet
-        payload = bytearray()
-        read_bytes = 1
-        while read_bytes < length:
-            next_payload = await self.__reader.read(n=length - read_bytes)
-            if len(next_payload) == 0:
-                raise asyncio.IncompleteReadError(next_payload, length - read_bytes)
-            payload.extend(next_payload)
-            read_bytes += len(next_payload)
+        # Length and operation are read together. readexactly() then waits for the whole payload to be buffered
+        # and copies it out once, rather than growing a bytearray chunk by chunk and copying it again to bytes.
+        # Both raise IncompleteReadError if the socket is closed mid-frame.
+        header = await self.__reader.readexactly(5)
+        length = UtilInternal.int_from_bytes(header[:4])
+        operation = header[4]
+
+        payload = await self.__reader.readexactly(length - 1)
 
         try:
             op = Operation.from_dict(operation)
@@ -172,79 +341,57 @@ class StreamManagerClient:
             self.logger.error("Found unknown operation %d", operation)
             op = Operation.Unknown
 
-        return MessageFrame(operation=op, payload=bytes(payload))
+        return MessageFrame(operation=op, payload=payload)
 
     async def __read_loop(self):
         # Continually try to read packets from the socket
         while not self.__closed:
             try:
                 try:
-                    self.__log_trace("Starting long poll read")
+                    trace = self.logger.isEnabledFor(5)
+                    if trace:
+                        self.__log_trace("Starting long poll read")
                     response = await self.__read_message_frame()
-                    self.__log_trace("Got message frame from server: %s", response)
-                except asyncio.IncompleteReadError:
+                    if trace:
+                        self.__log_trace("Got message frame from server: %s", response)
+                except (asyncio.IncompleteReadError, ConnectionError):
                     if self.__closed:
                         return
                     self.logger.error("Unable to read from socket, likely socket is closed or server died")
-                    self.connected = False
-                    try:
-                        await self.__connect()
-                    except ConnectionError:
-                        # Already logged in __connect, so just ignore it here
-                        pass
-                    except ConnectFailedException:
-                        # Already logged in __connect_request_response, so just ignore it here
-                        pass
+                    self.__connection_lost()
+                    # The reconnected socket gets a read loop of its own
+                    await self.__reconnect()
                     return
 
                 payload = cbor2.loads(response.payload)
                 await self.__handle_read_response(payload, response)
+            except asyncio.CancelledError:
+                # The client is closing. Before Python 3.8 CancelledError is an Exception, so it is re-raised first
+                raise
             except Exception:
                 self.logger.exception("Unhandled exception occurred")
                 return
 
     async def __handle_read_response(self, payload, response):
-        if response.operation == Operation.ReadMessagesResponse:
-            response = ReadMessagesResponse.from_dict(payload)
-            self.logger.debug("Received ReadMessagesResponse from server")
-            await self.__requests[response.request_id].put(response)
-        elif response.operation == Operation.CreateMessageStreamResponse:
-            response = CreateMessageStreamResponse.from_dict(payload)
-            self.logger.debug("Received CreateMessageStreamResponse from server: %s", response)
-            await self.__requests[response.request_id].put(response)
-        elif response.operation == Operation.DeleteMessageStreamResponse:
-            response = DeleteMessageStreamResponse.from_dict(payload)
-            self.logger.debug("Received DeleteMessageStreamResponse from server: %s", response)
-            await self.__requests[response.request_id].put(response)
-        elif response.operation == Operation.UpdateMessageStreamResponse:
-            response = UpdateMessageStreamResponse.from_dict(payload)
-            self.logger.debug("Received UpdateMessageStreamResponse from server: %s", response)
-            await self.__requests[response.request_id].put(response)
-        elif response.operation == Operation.AppendMessageResponse:
-            response = AppendMessageResponse.from_dict(payload)
-            self.logger.debug("Received AppendMessageResponse from server: %s", response)
-            await self.__requests[response.request_id].put(response)
-        elif response.operation == Operation.ListStreamsResponse:
-            response = ListStreamsResponse.from_dict(payload)
-            self.logger.debug("Received ListStreamsResponse from server: %s", response)
-            await self.__requests[response.request_id].put(response)
-        elif response.operation == Operation.DescribeMessageStreamResponse:
-            response = DescribeMessageStreamResponse.from_dict(payload)
-            self.logger.debug("Received DescribeMessageStreamResponse from server: %s", response)
-            await self.__requests[response.request_id].put(response)
-        elif response.operation == Operation.UnknownOperationError:
-            self.logger.error(
-                "Received response with unsupported operation from server: %s. "
-                "You should update your server version",
-                response.operation,
-            )
-            response = UnknownOperationError.from_dict(payload)
-            await self.__requests[response.request_id].put(response)
+        response_type = self.__RESPONSE_TYPES.get(response.operation)
+        if response_type is not None:
+            if response.operation == Operation.UnknownOperationError:
+                self.logger.error(
+                    "Received response with unsupported operation from server: %s. "
+                    "You should update your server version",
+                    response.operation,
+                )
+            response = Codec.decode_response(response_type, payload)
+            if self.logger.isEnabledFor(logging.DEBUG):
+                if response_type in self.__UNLOGGED_RESPONSE_TYPES:
+                    self.logger.debug("Received %s from server", response_type.__name__)
+                else:
+                    self.logger.debug("Received %s from server: %s", response_type.__name__, response)
+            self.__resolve(response.request_id, response)
         elif response.operation == Operation.Unknown:
             self.logger.error("Received response with unknown operation from server: %s", response)
             try:
-                request_id = cbor2.loads(response.payload)["requestId"]
-                await self.__requests[request_id].put(response)
+                self.__resolve(payload["requestId"], response)
             except Exception:
                 # We tried our best to figure out the request id, but it failed.
                 # We already logged the unknown operation, so there's nothing
@@ -265,9 +412,7 @@ class StreamManagerClient:
         # Write the connect version
         self.__writer.write(UtilInternal.int_to_bytes(self.__CONNECT_VERSION, 1))
         # Write request to socket
-        frame = MessageFrame(operation=Operation.Connect, payload=cbor2.dumps(data.as_dict()))
-        for b in UtilInternal.encode_frame(frame):
-            self.__writer.write(b)
+        self.__write_request(Operation.Connect, data)
         await self.__writer.drain()
 
         # Read connect version
@@ -315,33 +460,85 @@ class StreamManagerClient:
             if validation:
                 raise ValidationException(validation)
 
-            # If we're not connected, immediately try to reconnect
-            if not self.connected:
-                await self.__connect()
+            # If we're not connected, wait for the connection to come back
+            await self.__wait_connected()
 
-            self.__requests[data.request_id] = asyncio.Queue(1)
+            # Register the response future before writing so that the read loop can always resolve it
+            future = self.__loop.create_future()
+            self.__requests[data.request_id] = future
+            replayable = operation in self.__REPLAYABLE_OPERATIONS
+            if replayable:
+                self.__replayable_requests[data.request_id] = (operation, data)
 
             # Write request to socket
-            frame = MessageFrame(operation=operation, payload=cbor2.dumps(data.as_dict()))
-            for b in UtilInternal.encode_frame(frame):
-                self.__writer.write(b)
-            await self.__writer.drain()
+            try:
+                self.__write_request(operation, data)
+                await self.__drain()
+            except ConnectionError:
+                # The read loop notices the lost connection too, and sends replayable requests again once reconnected
+                if not replayable:
+                    raise
 
             # Wait for reader to come back with the response
-            result = await self.__requests[data.request_id].get()
-            # Drop async queue from request map
-            del self.__requests[data.request_id]
+            result = await future
             if isinstance(result, MessageFrame) and result.operation == Operation.Unknown:
                 raise ClientException("Received response with unknown operation from server")
             return result
 
         # Perform the actual work as async so that we can put a timeout on the whole operation
+        caller = asyncio.current_task(loop=self.__loop)
+        self.__callers.add(caller)
+        try:
+            return await asyncio.wait_for(inner(operation, data), timeout=self.request_timeout)
+        except asyncio.CancelledError:
+            # Closing the client cancelled what the request was waiting on
+            self.__check_closed()
+            raise
+        finally:
+            # Drop the response future from request map, whether it was resolved, timed out or cancelled
+            self.__requests.pop(data.request_id, None)
+            self.__replayable_requests.pop(data.request_id, None)
+            self.__callers.discard(caller)
+
+    async def __send_and_receive_many(self, operation, requests):
+        """
+        Write every request, drain once and wait for all the responses. Requests must already be validated.
+        Returns the response for each request, or the exception that this request failed with.
+        """
+
+        async def inner(operation, requests):
+            # If we're not connected, wait for the connection to come back
+            await self.__wait_connected()
+
+            futures = []
+            for data in requests:
+                future = self.__loop.create_future()
+                self.__requests[data.request_id] = future
+                futures.append(future)
+                self.__write_request(operation, data)
+            await self.__drain()
+
+            return await asyncio.gather(*futures, return_exceptions=True)
+
+        caller = asyncio.current_task(loop=self.__loop)
+        self.__callers.add(caller)
         try:
-            return await asyncio.wait_for(inner(operation, data), timeout=self.request_timeout, loop=self.__loop)
-        except asyncio.TimeoutError:
-            # Drop async queue from request map
-            del self.__requests[data.request_id]
+            results = await asyncio.wait_for(inner(operation, requests), timeout=self.request_timeout)
+        except asyncio.CancelledError:
+            # Closing the client cancelled what the requests were waiting on
+            self.__check_closed()
             raise
+        finally:
+            for data in requests:
+                self.__requests.pop(data.request_id, None)
+            self.__callers.discard(caller)
+
+        return [
+            ClientException("Received response with unknown operation from server")
+            if isinstance(result, MessageFrame) and result.operation == Operation.Unknown
+            else result
+            for result in results
+        ]
 
     def __validate_read_message_options(self, options: Optional[ReadMessagesOptions]):
         if options is not None:
@@ -370,6 +567,41 @@ class StreamManagerClient:
         UtilInternal.raise_on_error_response(append_message_response)
         return append_message_response.sequence_number
 
+    async def _append_messages(
+        self, stream_name: str, data: Iterable[bytes]
+    ) -> List[Union[int, StreamManagerException]]:
+        # The stream name and request id format are common to the whole batch, so validate them only once
+        validation = UtilInternal.is_invalid(
+            AppendMessageRequest(request_id=UtilInternal.get_request_id(), name=stream_name, payload=b"\0")
+        )
+        if validation:
+            raise ValidationException(validation)
+
+        results = []
+        requests = []
+        for payload in data:
+            request = AppendMessageRequest(request_id=UtilInternal.get_request_id(), name=stream_name, payload=payload)
+            if type(payload) is bytes and len(payload) > 0:
+                requests.append(request)
+                results.append(request)
+            else:
+                # Only the payload can be invalid at this point, run the full validation to get the usual message
+                results.append(ValidationException(UtilInternal.is_invalid(request)))
+
+        responses = iter(await self.__send_and_receive_many(Operation.AppendMessage, requests) if requests else [])
+        for i, result in enumerate(results):
+            if not isinstance(result, AppendMessageRequest):
+                continue
+            response = next(responses)  # type: Union[AppendMessageResponse, BaseException]
+            try:
+                if isinstance(response, BaseException):
+                    raise response
+                UtilInternal.raise_on_error_response(response)
+                results[i] = response.sequence_number
+            except StreamManagerException as e:
+                results[i] = e
+        return results
+
     async def _create_message_stream(self, definition: MessageStreamDefinition) -> None:
         if not isinstance(definition, MessageStreamDefinition):
             raise ValidationException("definition argument to create_stream must be a MessageStreamDefinition object")
@@ -410,6 +642,72 @@ class StreamManagerClient:
         UtilInternal.raise_on_error_response(read_messages_response)
         return read_messages_response.messages
 
+    @staticmethod
+    def __next_batch_size(messages: List[Message], batch_size: int, max_batch_bytes: int) -> int:
+        # Size the next read from the average payload size of the last one
+        payload_bytes = sum(len(message.payload or b"") for message in messages)
+        if payload_bytes == 0:
+            return batch_size
+        return max(1, min(batch_size, max_batch_bytes * len(messages) // payload_bytes))
+
+    async def _iter_message_batches(
+        self,
+        stream_name: str,
+        start_sequence: int,
+        batch_size: int,
+        read_timeout_millis: int,
+        max_batch_bytes: int,
+        stop_at_end: bool,
+    ):
+        """
+        Yield (messages, next sequence number) for consecutive batches of the stream. The read of the next batch is
+        sent as soon as a batch is yielded, so it is already in flight while the caller processes the current one.
+        """
+
+        def read(count):
+            options = ReadMessagesOptions(
+                desired_start_sequence_number=start_sequence,
+                min_message_count=1,
+                max_message_count=count,
+                read_timeout_millis=read_timeout_millis,
+            )
+            return self.__create_task(self._read_messages(stream_name, options))
+
+        count = batch_size
+        pending = read(count)
+        try:
+            while True:
+                messages = None
+                try:
+                    messages = await pending
+                except ResponsePayloadTooLargeException:
+                    if count == 1:
+                        raise
+                    # Payload sizes were underestimated, so stay at the smaller size from now on
+                    batch_size = count = count // 2
+                except NotEnoughMessagesException:
+                    if stop_at_end:
+                        return
+                else:
+                    start_sequence = messages[-1].sequence_number + 1
+                    count = self.__next_batch_size(messages, batch_size, max_batch_bytes)
+
+                pending = read(count)
+                if messages:
+                    yield messages, start_sequence
+        finally:
+            # Nobody is waiting for the prefetched batch anymore
+            if pending.done():
+                if not pending.cancelled():
+                    pending.exception()
+            else:
+                pending.cancel()
+
+    @staticmethod
+    async def __await(awaitable):
+        # run_coroutine_threadsafe only accepts coroutines, which async generator methods do not return
+        return await awaitable
+
     async def _list_streams(self) -> List[str]:
         list_streams_response = await self.__send_and_receive(
             Operation.ListStreams, data=ListStreamsRequest()
@@ -454,6 +752,93 @@ class StreamManagerClient:
         self.__check_closed()
         return UtilInternal.sync(self._read_messages(stream_name, options), loop=self.__loop)
 
+    def iter_messages(
+        self,
+        stream_name: str,
+        start_sequence: int = 0,
+        batch_size: int = 100,
+        read_timeout_millis: int = 1000,
+        checkpoint: Optional[Callable[[int], None]] = None,
+        max_batch_bytes: int = __ITER_MAX_BATCH_BYTES,
+        stop_at_end: bool = False,
+    ) -> Iterator[Message]:
+        """
+        Iterate over the messages of a stream, starting at start_sequence. Messages are read in batches of up to
+        batch_size messages, and the next batch is read while the caller processes the current one.
+        Batches are sized from the payload sizes seen so far to stay under max_batch_bytes, and a batch is read
+        again at half its size if the server still answers with ResponsePayloadTooLarge.
+
+        :param stream_name: The name of the stream to read from.
+        :param start_sequence: Sequence number of the first message to read.
+            Reading starts at the beginning of the stream if that message is no longer available.
+        :param batch_size: The maximum number of messages read at once.
+        :param read_timeout_millis: How long each read waits for at least one message.
+            Must be less than or equal to the client's request_timeout.
+        :param checkpoint: (Optional) Called with the next sequence number to read once every message of a batch
+            has been processed, that is when the message following the batch is requested.
+            Persisting it and passing it back as start_sequence resumes reading without skipping any message.
+        :param max_batch_bytes: Payload bytes to aim for per batch.
+        :param stop_at_end: Stop once no message arrives within read_timeout_millis, instead of waiting for more.
+        :return: Iterator of messages, in order.
+        :raises: :exc:`~.exceptions.StreamManagerException` and subtypes based on the precise error.
+        :raises: :exc:`asyncio.TimeoutError` if a request times out.
+        :raises: :exc:`ConnectionError` if the client is unable to reconnect to the server.
+        """
+        self.__check_closed()
+        batches = self._iter_message_batches(
+            stream_name, start_sequence, batch_size, read_timeout_millis, max_batch_bytes, stop_at_end
+        )
+        try:
+            while True:
+                try:
+                    messages, next_sequence_number = UtilInternal.sync(
+                        self.__await(batches.__anext__()), loop=self.__loop
+                    )
+                except StopAsyncIteration:
+                    return
+                yield from messages
+                if checkpoint is not None:
+                    checkpoint(next_sequence_number)
+        finally:
+            if not self.__loop.is_closed():
+                UtilInternal.sync(self.__await(batches.aclose()), loop=self.__loop)
+
+    async def iter_messages_async(
+        self,
+        stream_name: str,
+        start_sequence: int = 0,
+        batch_size: int = 100,
+        read_timeout_millis: int = 1000,
+        checkpoint: Optional[Callable[[int], None]] = None,
+        max_batch_bytes: int = __ITER_MAX_BATCH_BYTES,
+        stop_at_end: bool = False,
+    ) -> AsyncIterator[Message]:
+        """
+        Asynchronous iterator variant of :meth:`iter_messages`, to be used with ``async for`` from the caller's own
+        event loop. Takes the same parameters and raises the same exceptions.
+        """
+        self.__check_closed()
+        batches = self._iter_message_batches(
+            stream_name, start_sequence, batch_size, read_timeout_millis, max_batch_bytes, stop_at_end
+        )
+        try:
+            while True:
+                try:
+                    messages, next_sequence_number = await asyncio.wrap_future(
+                        asyncio.run_coroutine_threadsafe(self.__await(batches.__anext__()), loop=self.__loop)
+                    )
+                except StopAsyncIteration:
+                    return
+                for message in messages:
+                    yield message
+                if checkpoint is not None:
+                    checkpoint(next_sequence_number)
+        finally:
+            if not self.__loop.is_closed():
+                await asyncio.wrap_future(
+                    asyncio.run_coroutine_threadsafe(self.__await(batches.aclose()), loop=self.__loop)
+                )
+
     def append_message(self, stream_name: str, data: bytes) -> int:
         """
         Append a message into the specified message stream. Returns the sequence number of the message
@@ -469,6 +854,36 @@ class StreamManagerClient:
         self.__check_closed()
         return UtilInternal.sync(self._append_message(stream_name, data), loop=self.__loop)
 
+    def append_message_async(self, stream_name: str, data: bytes) -> concurrent.futures.Future:
+        """
+        Append a message into the specified message stream without waiting for it to be acknowledged.
+        Any number of appends can be in flight at once; they are pipelined over the client's single connection.
+
+        :param stream_name: The name of the stream to append to.
+        :param data: Bytes type data.
+        :return: :class:`concurrent.futures.Future` resolving to the sequence number that the message was assigned,
+            or raising the same exceptions as :meth:`append_message`.
+        """
+        self.__check_closed()
+        return asyncio.run_coroutine_threadsafe(self._append_message(stream_name, data), loop=self.__loop)
+
+    def append_messages(self, stream_name: str, data: Iterable[bytes]) -> List[Union[int, StreamManagerException]]:
+        """
+        Append several messages into the specified message stream. The whole batch is written to the
+        client's single connection and flushed at once instead of waiting for each response in turn.
+        A message that fails does not abort the rest of the batch.
+
+        :param stream_name: The name of the stream to append to.
+        :param data: Iterable of bytes type data.
+        :return: One entry per message, in the order of data: the sequence number that the message was assigned,
+            or the :exc:`~.exceptions.StreamManagerException` (subtype) it failed with.
+        :raises: :exc:`~.exceptions.ValidationException` if the stream name is invalid.
+        :raises: :exc:`asyncio.TimeoutError` if the request times out.
+        :raises: :exc:`ConnectionError` if the client is unable to reconnect to the server.
+        """
+        self.__check_closed()
+        return UtilInternal.sync(self._append_messages(stream_name, data), loop=self.__loop)
+
     def create_message_stream(self, definition: MessageStreamDefinition) -> None:
         """
         Create a message stream with a given definition.
@@ -536,6 +951,25 @@ class StreamManagerClient:
         self.__check_closed()
         return UtilInternal.sync(self._describe_message_stream(stream_name), loop=self.__loop)
 
+    def add_connection_state_listener(self, listener: Callable[[bool], None]) -> None:
+        """
+        Register a callable to be told whenever the connection to the server is lost or established again.
+        The client reconnects by itself, retrying with exponential backoff until the connection is back.
+        Listeners are called from the client's event loop thread and must not block.
+
+        :param listener: Called with True once the client has (re)connected, and with False when the connection
+            was lost.
+        """
+        self.__connection_state_listeners.append(listener)
+
+    def remove_connection_state_listener(self, listener: Callable[[bool], None]) -> None:
+        """
+        Stop calling a listener registered with :meth:`add_connection_state_listener`.
+
+        :param listener: The listener to remove.
+        """
+        self.__connection_state_listeners.remove(listener)
+
     def close(self):
         """
         Call to shutdown the client and close all existing connections. Once a client is closed it cannot be reused.
@@ -546,3 +980,60 @@ class StreamManagerClient:
             UtilInternal.sync(self._close(), loop=self.__loop)
         if not self.__loop.is_closed():
             self.__loop.call_soon_threadsafe(self.__loop.stop)
+
+
+class SharedStreamManagerClient:
+    """
+    A handle to a StreamManagerClient shared by the whole process. Handles created with the same host, port and
+    auth token share one client, and so one event loop thread and one connection to the server. Only the first
+    handle connects; creating further handles is nearly free, which suits Lambda functions that build a client
+    on every invocation. A handle supports every method of :class:`StreamManagerClient`.
+
+    The shared client is closed once every handle to it has been closed. Options other than host and port only
+    take effect for the handle which creates the shared client.
+
+    :param host: The host which StreamManager server is running on. Default is localhost.
+    :param port: The port which StreamManager server is running on. Default is found in environment variables.
+    :param kwargs: Further :class:`StreamManagerClient` options, used if the shared client has to be created.
+
+    :raises: The same exceptions as :class:`StreamManagerClient` if the shared client has to be created.
+    """
+
+    # (host, port, auth token) -> [shared client, number of open handles]
+    __clients = {}
+    __lock = Lock()
+
+    def __init__(self, host="127.0.0.1", port=None, **kwargs):
+        if port is None:
+            port = int(os.getenv("STREAM_MANAGER_SERVER_PORT", 8088))
+        self.__client = None
+        self.__key = (host, port, os.getenv("AWS_CONTAINER_AUTHORIZATION_TOKEN"))
+        with SharedStreamManagerClient.__lock:
+            entry = SharedStreamManagerClient.__clients.get(self.__key)
+            if entry is None:
+                entry = [StreamManagerClient(host=host, port=port, **kwargs), 0]
+                SharedStreamManagerClient.__clients[self.__key] = entry
+            entry[1] += 1
+        self.__client = entry[0]
+
+    def __getattr__(self, name):
+        client = self.__client
+        if client is None:
+            raise StreamManagerException("Client is closed. Create a new client first.")
+        return getattr(client, name)
+
+    def close(self):
+        """
+        Release this handle. The shared client is closed when its last handle is released.
+        """
+        client = self.__client
+        if client is None:
+            return
+        self.__client = None
+        with SharedStreamManagerClient.__lock:
+            entry = SharedStreamManagerClient.__clients[self.__key]
+            entry[1] -= 1
+            if entry[1] > 0:
+                return
+            del SharedStreamManagerClient.__clients[self.__key]
+        client.close()
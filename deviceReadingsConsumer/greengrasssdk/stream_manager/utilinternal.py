@@ -82,97 +82,131 @@ class UtilInternal:
     def get_request_id():
         return str(uuid.uuid4())
 
+    # Validation functions generated for each class, see __compile_validator
+    __validators = {}
+
+    # Plain value types never carry validations of their own, so there is nothing to recurse into
+    __SCALAR_TYPES = (str, int, float, bool, bytes)
+
     @staticmethod
     def is_invalid(o):
-        if not hasattr(o, "_validations_map"):
-            return False
-        if not hasattr(o, "_types_map"):
-            return False
-        for prop_name, validations in o._validations_map.items():
-            if not hasattr(o, prop_name):
-                return "Object is malformed, missing property: {}".format(prop_name)
+        validator = UtilInternal.__validators.get(type(o))
+        if validator is None:
+            validator = UtilInternal.__compile_validator(type(o))
+        return validator(o)
+
+    @staticmethod
+    def __compile_validator(cls):
+        """
+        Generate the validation function of a data class from its _validations_map and _types_map.
+        Checks are unrolled per property and patterns compiled once, while the order of the checks and
+        the messages returned are the same as evaluating the maps on every call.
+        """
+        if not hasattr(cls, "_validations_map") or not hasattr(cls, "_types_map"):
+            UtilInternal.__validators[cls] = UtilInternal.__always_valid
+            return UtilInternal.__always_valid
+
+        namespace = {"is_invalid": UtilInternal.is_invalid, "scalar_types": UtilInternal.__SCALAR_TYPES}
+        lines = ["def validate(o):"]
+
+        def emit(indent, line):
+            lines.append("    " * indent + line)
+
+        for prop_name, validations in cls._validations_map.items():
+            emit(1, "try:")
+            emit(2, "v = o.{}".format(prop_name))
+            emit(1, "except AttributeError:")
+            emit(2, "return {!r}".format("Object is malformed, missing property: {}".format(prop_name)))
+
             # Validate all properties on lists
-            if type(getattr(o, prop_name)) == list:
-                for i, v in enumerate(getattr(o, prop_name)):
-                    result = UtilInternal.is_invalid(v)
-                    if result:
-                        return "Property {}[{}] is invalid because {}".format(prop_name, i, result)
+            emit(1, "if type(v) == list:")
+            emit(2, "for i, x in enumerate(v):")
+            emit(3, "r = is_invalid(x)")
+            emit(3, "if r:")
+            emit(4, "return {!r}.format(i, r)".format("Property " + prop_name + "[{}] is invalid because {}"))
 
             # Recurse down to check validity of objects within objects
-            result = UtilInternal.is_invalid(getattr(o, prop_name))
-            if result:
-                return "Property {} is invalid because {}".format(prop_name, result)
+            emit(1, "if v is not None and type(v) not in scalar_types:")
+            emit(2, "r = is_invalid(v)")
+            emit(2, "if r:")
+            emit(3, "return {!r}.format(r)".format("Property " + prop_name + " is invalid because {}"))
 
             # Validate the property
-            if "required" in validations and validations["required"] and getattr(o, prop_name) is None:
-                return "Property {} is required, but was None".format(prop_name)
-            if (
-                "minLength" in validations
-                and getattr(o, prop_name) is not None
-                and len(getattr(o, prop_name)) < validations["minLength"]
-            ):
-                return "Property {} must have a minimum length of {}, but found length of {}".format(
-                    prop_name, validations["minLength"], len(getattr(o, prop_name))
-                )
-            if (
-                "maxLength" in validations
-                and getattr(o, prop_name) is not None
-                and len(getattr(o, prop_name)) > validations["maxLength"]
-            ):
-                return "Property {} must have a maximum length of {}, but found length of {}".format(
-                    prop_name, validations["maxLength"], len(getattr(o, prop_name))
-                )
-            if (
-                "minItems" in validations
-                and getattr(o, prop_name) is not None
-                and len(getattr(o, prop_name)) < validations["minItems"]
-            ):
-                return "Property {} must have at least {} items, but found {}".format(
-                    prop_name, validations["minItems"], len(getattr(o, prop_name))
-                )
-            if (
-                "maxItems" in validations
-                and getattr(o, prop_name) is not None
-                and len(getattr(o, prop_name)) > validations["maxItems"]
-            ):
-                return "Property {} must have at most {} items, but found {}".format(
-                    prop_name, validations["maxItems"], len(getattr(o, prop_name))
-                )
-            if (
-                "maximum" in validations
-                and getattr(o, prop_name) is not None
-                and getattr(o, prop_name) > validations["maximum"]
-            ):
-                return "Property {} must be at most {}".format(prop_name, validations["maximum"])
-            if (
-                "minimum" in validations
-                and getattr(o, prop_name) is not None
-                and getattr(o, prop_name) < validations["minimum"]
-            ):
-                return "Property {} must be at least {}".format(prop_name, validations["minimum"])
-            if (
-                "pattern" in validations
-                and getattr(o, prop_name) is not None
-                and re.fullmatch(validations["pattern"], getattr(o, prop_name)) is None
-            ):
-                return "Property {} must match regex {}".format(prop_name, validations["pattern"])
-
-        for prop_name, types in o._types_map.items():
+            if "required" in validations and validations["required"]:
+                emit(1, "if v is None:")
+                emit(2, "return {!r}".format("Property {} is required, but was None".format(prop_name)))
+            checks = []
+            if "minLength" in validations:
+                checks.append(("len(v) < {!r}".format(validations["minLength"]), "{!r}.format(len(v))".format(
+                    "Property {} must have a minimum length of {}, but found length of ".format(
+                        prop_name, validations["minLength"]
+                    ) + "{}"
+                )))
+            if "maxLength" in validations:
+                checks.append(("len(v) > {!r}".format(validations["maxLength"]), "{!r}.format(len(v))".format(
+                    "Property {} must have a maximum length of {}, but found length of ".format(
+                        prop_name, validations["maxLength"]
+                    ) + "{}"
+                )))
+            if "minItems" in validations:
+                checks.append(("len(v) < {!r}".format(validations["minItems"]), "{!r}.format(len(v))".format(
+                    "Property {} must have at least {} items, but found ".format(prop_name, validations["minItems"])
+                    + "{}"
+                )))
+            if "maxItems" in validations:
+                checks.append(("len(v) > {!r}".format(validations["maxItems"]), "{!r}.format(len(v))".format(
+                    "Property {} must have at most {} items, but found ".format(prop_name, validations["maxItems"])
+                    + "{}"
+                )))
+            if "maximum" in validations:
+                checks.append(("v > {!r}".format(validations["maximum"]), "{!r}".format(
+                    "Property {} must be at most {}".format(prop_name, validations["maximum"])
+                )))
+            if "minimum" in validations:
+                checks.append(("v < {!r}".format(validations["minimum"]), "{!r}".format(
+                    "Property {} must be at least {}".format(prop_name, validations["minimum"])
+                )))
+            if "pattern" in validations:
+                pattern_name = "pattern_{}".format(prop_name)
+                namespace[pattern_name] = re.compile(validations["pattern"])
+                checks.append(("{}.fullmatch(v) is None".format(pattern_name), "{!r}".format(
+                    "Property {} must match regex {}".format(prop_name, validations["pattern"])
+                )))
+            if checks:
+                emit(1, "if v is not None:")
+                for condition, message in checks:
+                    emit(2, "if {}:".format(condition))
+                    emit(3, "return {}".format(message))
+
+        for prop_name, types in cls._types_map.items():
             # Validate all properties with their respective types
-            if "type" in types and getattr(o, prop_name) is not None:
-                result = isinstance(getattr(o, prop_name), types["type"])
-                if not result:
-                    return "Property {} is invalid because it must be of type {}".format(
-                        prop_name, types["type"].__name__
-                    )
-                if types["type"] == list and "subtype" in types:
-                    for i, v in enumerate(getattr(o, prop_name)):
-                        result = isinstance(v, types["subtype"])
-                        if not result:
-                            return "Property {}[{}] is invalid because it must be of type {}".format(
-                                prop_name, i, types["subtype"].__name__
-                            )
+            if "type" not in types:
+                continue
+            type_name = "type_{}".format(prop_name)
+            namespace[type_name] = types["type"]
+            emit(1, "v = o.{}".format(prop_name))
+            emit(1, "if v is not None:")
+            emit(2, "if not isinstance(v, {}):".format(type_name))
+            emit(3, "return {!r}".format(
+                "Property {} is invalid because it must be of type {}".format(prop_name, types["type"].__name__)
+            ))
+            if types["type"] == list and "subtype" in types:
+                subtype_name = "subtype_{}".format(prop_name)
+                namespace[subtype_name] = types["subtype"]
+                emit(2, "for i, x in enumerate(v):")
+                emit(3, "if not isinstance(x, {}):".format(subtype_name))
+                emit(4, "return {!r}.format(i, {}.__name__)".format(
+                    "Property " + prop_name + "[{}] is invalid because it must be of type {}", subtype_name
+                ))
+
+        emit(1, "return False")
+        exec("\n".join(lines), namespace)
+        validator = namespace["validate"]
+        UtilInternal.__validators[cls] = validator
+        return validator
 
+    @staticmethod
+    def __always_valid(o):
         return False
 
     @staticmethod
@@ -1,19 +1,263 @@
 import boto3
+from botocore.exceptions import ClientError
 import json
 import os
 import base64
+import hashlib
+import time
+import logging
+import threading
+import re
 
 s3 = boto3.client('s3')
+iot = boto3.client('iot-data')
+sagemaker = boto3.client('sagemaker')
+
+S3_BUCKET = 'sagemaker-us-east-2-583938224360'
+# Used when no training job output with a model can be found under MODEL_OUTPUT_PREFIX
+S3_PREFIX = 'smartcity-waste-management-garbage-level-training-data/output/garbage-bin-level-forecaster-2021-02-16-16-57-57-804/output'
+S3_FILE = 'model.tar.gz'
+
+# Training jobs write their model to <MODEL_OUTPUT_PREFIX>/<training job name>/output/model.tar.gz
+MODEL_OUTPUT_PREFIX = os.environ.get('MODEL_OUTPUT_PREFIX', 'smartcity-waste-management-garbage-level-training-data/output')
+# 's3' lists the job folders under MODEL_OUTPUT_PREFIX, 'sagemaker' asks SageMaker for the newest completed job
+MODEL_RESOLVER = os.environ.get('MODEL_RESOLVER', 's3')
+# Only jobs whose name contains this are considered by the 'sagemaker' resolver
+TRAINING_JOB_NAME_CONTAINS = os.environ.get('TRAINING_JOB_NAME_CONTAINS', 'garbage-bin-level-forecaster')
+MODEL_RESOLVE_TTL = int(os.environ.get('MODEL_RESOLVE_TTL', 60))
+
+# Error codes of a HEAD on a key that does not exist. Any other error is not taken to mean there is no model
+MISSING_OBJECT_CODES = ('404', 'NoSuchKey', 'NotFound')
+
+# Timestamp SageMaker appends to generated training job names
+job_timestamp_regex = re.compile(r'\d{4}(-\d{2}){5}-\d{3}$')
+
+# 'inline' returns the whole artifact hex encoded in the response, 'stream' publishes it in frames to MODEL_TOPIC
+DELIVERY_MODE = os.environ.get('MODEL_DELIVERY_MODE', 'inline')
+MODEL_TOPIC = os.environ.get('MODEL_TOPIC', 'model/artifact/frames')
+
+# Bytes of the artifact per frame. Base64 frames grow by a third, and must stay under the 128 KiB MQTT message limit
+CHUNK_SIZE = int(os.environ.get('MODEL_CHUNK_SIZE', 64 * 1024))
+# 'base64' frames are a JSON object carrying the chunk in 'data',
+# 'binary' frames are the same JSON object without 'data', a newline, then the raw chunk
+FRAME_ENCODING = os.environ.get('MODEL_FRAME_ENCODING', 'base64')
+
+class LatestModelResolver:
+    """
+    Finds the output prefix of the newest training job that produced a model, and
+    remembers it for ttl seconds so that warm invocations skip the listing.
+
+    The 's3' strategy lists one level of MODEL_OUTPUT_PREFIX with a delimiter, so
+    it pages through one entry per training job rather than every key the jobs
+    wrote, then checks job folders newest first (by the creation time that ends
+    generated job names) until one holds a model. The 'sagemaker' strategy asks for the most
+    recently created completed job and reads its model location.
+    """
+    def __init__(self, bucket=S3_BUCKET, output_prefix=MODEL_OUTPUT_PREFIX, file_name=S3_FILE,
+                 strategy=MODEL_RESOLVER, ttl=MODEL_RESOLVE_TTL, s3_client=None, sagemaker_client=None):
+        self.bucket = bucket
+        self.output_prefix = output_prefix.rstrip('/') + '/'
+        self.file_name = file_name
+        self.strategy = strategy
+        self.ttl = ttl
+        self.s3 = s3_client or s3
+        self.sagemaker = sagemaker_client or sagemaker
+        self._cached = None
+        self._lock = threading.Lock()
+
+    def resolve(self):
+        """Return the S3 prefix holding the newest model, or None if there is none."""
+        with self._lock:
+            if self._cached is not None and self._cached[0] > time.monotonic():
+                return self._cached[1]
+            if self.strategy == 'sagemaker':
+                prefix = self._resolve_from_training_jobs()
+            else:
+                prefix = self._resolve_from_s3()
+            self._cached = (time.monotonic() + self.ttl, prefix)
+            return prefix
+
+    def invalidate(self):
+        with self._lock:
+            self._cached = None
+
+    def _resolve_from_s3(self):
+        job_prefixes = []
+        kwargs = {'Bucket': self.bucket, 'Prefix': self.output_prefix, 'Delimiter': '/'}
+        while True:
+            page = self.s3.list_objects_v2(**kwargs)
+            job_prefixes.extend(p['Prefix'] for p in page.get('CommonPrefixes', []))
+            if not page.get('IsTruncated'):
+                break
+            kwargs['ContinuationToken'] = page['NextContinuationToken']
+
+        for job_prefix in sorted(job_prefixes, key=job_sort_key, reverse=True):
+            prefix = job_prefix + 'output'
+            try:
+                self.s3.head_object(Bucket=self.bucket, Key=os.path.join(prefix, self.file_name))
+            except ClientError as e:
+                # Failed or still running jobs have no model yet. Throttling, access or other errors are raised,
+                # rather than passing over the newest model for an older one
+                if e.response.get('Error', {}).get('Code') not in MISSING_OBJECT_CODES:
+                    raise
+                continue
+            return prefix
+        return None
+
+    def _resolve_from_training_jobs(self):
+        jobs = self.sagemaker.list_training_jobs(
+            NameContains=TRAINING_JOB_NAME_CONTAINS,
+            StatusEquals='Completed',
+            SortBy='CreationTime',
+            SortOrder='Descending',
+            MaxResults=1,
+        )['TrainingJobSummaries']
+        if not jobs:
+            return None
+        job = self.sagemaker.describe_training_job(TrainingJobName=jobs[0]['TrainingJobName'])
+        bucket, _, key = job['ModelArtifacts']['S3ModelArtifacts'][len('s3://'):].partition('/')
+        if bucket != self.bucket:
+            logging.error('Model of %s is in bucket %s, expected %s', jobs[0]['TrainingJobName'], bucket, self.bucket)
+            return None
+        return os.path.dirname(key)
+
+def job_sort_key(job_prefix):
+    job_name = job_prefix.rstrip('/').rsplit('/', 1)[-1]
+    match = job_timestamp_regex.search(job_name)
+    return (match.group(0) if match else '', job_name)
+
+model_resolver = LatestModelResolver()
+
+def iter_object_chunks(bucket, key, etag, size, chunk_size=CHUNK_SIZE, client=None):
+    """
+    Yield (offset, chunk) over an S3 object with one ranged GET per chunk, so only
+    a single chunk is held in memory at a time. Every GET is conditional on etag,
+    so the object cannot change between chunks unnoticed. An empty object is a
+    single empty chunk, fetched without a GET.
+    """
+    client = client or s3
+    if size == 0:
+        yield 0, b''
+        return
+    for offset in range(0, size, chunk_size):
+        end = min(offset + chunk_size, size) - 1
+        response = client.get_object(
+            Bucket=bucket,
+            Key=key,
+            Range='bytes=%d-%d' % (offset, end),
+            IfMatch=etag,
+        )
+        yield offset, response['Body'].read()
+
+def encode_frame(header, chunk, encoding=FRAME_ENCODING):
+    if encoding == 'base64':
+        return json.dumps(dict(header, data=base64.b64encode(chunk).decode()))
+    if encoding == 'binary':
+        return json.dumps(header).encode() + b'\n' + chunk
+    raise ValueError('Unknown frame encoding %s' % encoding)
+
+def publish_model_frames(bucket, key, topic=MODEL_TOPIC, chunk_size=CHUNK_SIZE, encoding=FRAME_ENCODING, s3_client=None, iot_client=None):
+    """
+    Publish an S3 object to topic as numbered frames. Every frame carries the
+    object's ETag, its sequence number, the total number of frames, its offset,
+    its length and the SHA-256 of its chunk, so the edge can check each chunk and
+    reassemble them in order. The returned summary carries the SHA-256 of the
+    whole object to verify the result against. An empty object is published as
+    one empty frame, so the edge still completes it.
+    """
+    s3_client = s3_client or s3
+    iot_client = iot_client or iot
+
+    head = s3_client.head_object(Bucket=bucket, Key=key)
+    size = head['ContentLength']
+    etag = head['ETag']
+    total = max(1, (size + chunk_size - 1) // chunk_size)
+    file_name = os.path.basename(key)
+
+    digest = hashlib.sha256()
+    for seq, (offset, chunk) in enumerate(iter_object_chunks(bucket, key, etag, size, chunk_size, s3_client)):
+        digest.update(chunk)
+        header = {
+            'file_name': file_name,
+            'etag': etag,
+            'seq': seq,
+            'total': total,
+            'offset': offset,
+            'length': len(chunk),
+            'sha256': hashlib.sha256(chunk).hexdigest(),
+            'encoding': encoding,
+        }
+        iot_client.publish(topic=topic, qos=1, payload=encode_frame(header, chunk, encoding))
+
+    return {
+        'file_name': file_name,
+        'Content-Length': size,
+        'Content-Type': head['ContentType'],
+        'ETag': etag,
+        'sha256': digest.hexdigest(),
+        'frames': total,
+        'topic': topic,
+    }
+
+def get_model_version(head):
+    """
+    Version of an S3 object as the edge reports it back: its ETag, and the SHA-256
+    of its content if the uploader stored one in the object's sha256 metadata.
+    """
+    version = {'ETag': head['ETag']}
+    sha256 = head.get('Metadata', {}).get('sha256')
+    if sha256:
+        version['sha256'] = sha256
+    return version
+
+def is_unchanged(event, version):
+    """
+    Whether the edge already has this version: event may carry the 'etag' and/or
+    'sha256' of the model the edge holds. Every one of them that is also known for
+    the S3 object has to match, and at least one has to be compared.
+    """
+    reported = {'ETag': event.get('etag'), 'sha256': event.get('sha256')}
+    matched = False
+    for name, value in reported.items():
+        if value is None or version.get(name) is None:
+            continue
+        if version.get(name) != value:
+            return False
+        matched = True
+    return matched
 
 def lambda_handler(event, context):
-    s3_bucket = 'sagemaker-us-east-2-583938224360'
-    s3_prefix = 'smartcity-waste-management-garbage-level-training-data/output/garbage-bin-level-forecaster-2021-02-16-16-57-57-804/output'
-    s3_file = 'model.tar.gz'
-    
-    s3_path_key = os.path.join(s3_prefix, s3_file)
+    s3_bucket = S3_BUCKET
+    s3_file = S3_FILE
     
     
     try:
+        s3_prefix = model_resolver.resolve()
+        if s3_prefix is None:
+            logging.error('No trained model found under %s, using %s', MODEL_OUTPUT_PREFIX, S3_PREFIX)
+            s3_prefix = S3_PREFIX
+        s3_path_key = os.path.join(s3_prefix, s3_file)
+
+        event = event or {}
+        if 'etag' in event or 'sha256' in event:
+            version = get_model_version(s3.head_object(Bucket=s3_bucket, Key=s3_path_key))
+            if is_unchanged(event, version):
+                response = {
+                    'response_code' : 304,
+                    'message': 'unchanged',
+                    'file_name': s3_file,
+                }
+                response.update(version)
+                return response
+
+        if event.get('delivery', DELIVERY_MODE) == 'stream':
+            response = publish_model_frames(s3_bucket, s3_path_key)
+            response.update({
+                'response_code' : 200,
+                'message': 'success',
+            })
+            return response
+
         response = s3.get_object(Bucket=s3_bucket, Key=s3_path_key)
         payload = response['Body'].read()
         
@@ -23,6 +267,7 @@ def lambda_handler(event, context):
             'file_name': 'model.tar.gz',
             'Content-Length': response['ContentLength'],
             'Content-Type': response['ContentType'],
+            'ETag': response['ETag'],
             'payload' : payload.hex(),
         }
     except Exception as e:
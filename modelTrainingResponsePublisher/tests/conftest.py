@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The handler creates its boto3 clients on import, which needs a region but no credentials
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-2')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,134 @@
+import base64
+import hashlib
+import io
+import json
+
+import boto3
+import pytest
+from botocore.exceptions import ClientError
+from botocore.response import StreamingBody
+from botocore.stub import Stubber
+
+from modelTrainingResponsePublisher import encode_frame, publish_model_frames
+
+BUCKET = 'sagemaker-us-east-2-583938224360'
+KEY = 'smartcity-waste-management-garbage-level-training-data/output/job/output/model.tar.gz'
+ETAG = '"0123456789abcdef0123456789abcdef"'
+TOPIC = 'model/artifact/frames'
+CHUNK_SIZE = 64 * 1024
+
+
+def make_client(service):
+    return boto3.client(service, region_name='us-east-2', aws_access_key_id='test', aws_secret_access_key='test')
+
+
+@pytest.fixture
+def s3():
+    client = make_client('s3')
+    with Stubber(client) as stubber:
+        yield client, stubber
+        stubber.assert_no_pending_responses()
+
+
+@pytest.fixture
+def iot():
+    client = make_client('iot-data')
+    published = []
+    # The payloads are checked after the fact, so they are recorded as the client is called
+    client.meta.events.register('provide-client-params.iot-data.Publish', lambda params, **kwargs: published.append(params))
+    with Stubber(client) as stubber:
+        yield client, stubber, published
+        stubber.assert_no_pending_responses()
+
+
+def add_object(stubber, data, chunk_size=CHUNK_SIZE):
+    stubber.add_response('head_object', {'ContentLength': len(data), 'ETag': ETAG, 'ContentType': 'application/x-tar'},
+                         {'Bucket': BUCKET, 'Key': KEY})
+    for offset in range(0, len(data), chunk_size):
+        chunk = data[offset:offset + chunk_size]
+        stubber.add_response(
+            'get_object',
+            {'Body': StreamingBody(io.BytesIO(chunk), len(chunk)), 'ContentLength': len(chunk), 'ETag': ETAG},
+            {'Bucket': BUCKET, 'Key': KEY, 'Range': 'bytes=%d-%d' % (offset, offset + len(chunk) - 1), 'IfMatch': ETAG},
+        )
+
+
+def decode_frame(payload):
+    # As the edge's FrameAssembler reads them
+    if isinstance(payload, str):
+        header = json.loads(payload)
+        return header, base64.b64decode(header.pop('data'))
+    header, chunk = payload.split(b'\n', 1)
+    return json.loads(header.decode('utf-8')), chunk
+
+
+@pytest.mark.parametrize('encoding', ['base64', 'binary'])
+@pytest.mark.parametrize('size', [1, CHUNK_SIZE, 3 * CHUNK_SIZE + 100])
+def test_object_is_published_as_checked_frames(s3, iot, encoding, size):
+    (s3_client, s3_stubber), (iot_client, iot_stubber, published) = s3, iot
+    data = bytes(range(256)) * (size // 256) + bytes(size % 256)
+    add_object(s3_stubber, data)
+    total = (size + CHUNK_SIZE - 1) // CHUNK_SIZE
+    for _ in range(total):
+        iot_stubber.add_response('publish', {})
+
+    summary = publish_model_frames(BUCKET, KEY, topic=TOPIC, chunk_size=CHUNK_SIZE, encoding=encoding,
+                                   s3_client=s3_client, iot_client=iot_client)
+
+    assert summary == {
+        'file_name': 'model.tar.gz', 'Content-Length': size, 'Content-Type': 'application/x-tar', 'ETag': ETAG,
+        'sha256': hashlib.sha256(data).hexdigest(), 'frames': total, 'topic': TOPIC,
+    }
+    assert [(params['topic'], params['qos']) for params in published] == [(TOPIC, 1)] * total
+
+    assembled = bytearray(size)
+    for seq, params in enumerate(published):
+        header, chunk = decode_frame(params['payload'])
+        assert header == {
+            'file_name': 'model.tar.gz', 'etag': ETAG, 'seq': seq, 'total': total, 'offset': seq * CHUNK_SIZE,
+            'length': len(chunk), 'sha256': hashlib.sha256(chunk).hexdigest(), 'encoding': encoding,
+        }
+        assembled[header['offset']:header['offset'] + len(chunk)] = chunk
+    assert bytes(assembled) == data
+
+
+def test_frames_stay_under_the_mqtt_message_limit():
+    chunk = b'\xff' * CHUNK_SIZE
+    header = {'file_name': 'model.tar.gz', 'etag': ETAG, 'seq': 0, 'total': 1, 'offset': 0, 'length': len(chunk),
+              'sha256': hashlib.sha256(chunk).hexdigest()}
+    assert len(encode_frame(dict(header, encoding='base64'), chunk, 'base64')) < 128 * 1024
+    assert len(encode_frame(dict(header, encoding='binary'), chunk, 'binary')) < 128 * 1024
+    with pytest.raises(ValueError):
+        encode_frame(header, chunk, 'hex')
+
+
+def test_empty_object_is_published_as_one_empty_frame(s3, iot):
+    (s3_client, s3_stubber), (iot_client, iot_stubber, published) = s3, iot
+    add_object(s3_stubber, b'')
+    iot_stubber.add_response('publish', {})
+
+    summary = publish_model_frames(BUCKET, KEY, topic=TOPIC, s3_client=s3_client, iot_client=iot_client)
+
+    assert (summary['frames'], summary['sha256']) == (1, hashlib.sha256(b'').hexdigest())
+    [params] = published
+    header, chunk = decode_frame(params['payload'])
+    assert chunk == b''
+    assert (header['seq'], header['total'], header['offset'], header['length']) == (0, 1, 0, 0)
+    assert header['sha256'] == hashlib.sha256(b'').hexdigest()
+
+
+def test_object_replaced_during_the_transfer_fails_it(s3, iot):
+    (s3_client, s3_stubber), (iot_client, iot_stubber, published) = s3, iot
+    data = b'\1' * (2 * CHUNK_SIZE)
+    s3_stubber.add_response('head_object', {'ContentLength': len(data), 'ETag': ETAG, 'ContentType': 'application/x-tar'},
+                            {'Bucket': BUCKET, 'Key': KEY})
+    s3_stubber.add_response('get_object', {'Body': StreamingBody(io.BytesIO(data[:CHUNK_SIZE]), CHUNK_SIZE)},
+                            {'Bucket': BUCKET, 'Key': KEY, 'Range': 'bytes=0-%d' % (CHUNK_SIZE - 1), 'IfMatch': ETAG})
+    # The second ranged GET finds another version of the object
+    s3_stubber.add_client_error('get_object', service_error_code='PreconditionFailed', http_status_code=412)
+    iot_stubber.add_response('publish', {})
+
+    with pytest.raises(ClientError) as e:
+        publish_model_frames(BUCKET, KEY, topic=TOPIC, chunk_size=CHUNK_SIZE, s3_client=s3_client, iot_client=iot_client)
+    assert e.value.response['Error']['Code'] == 'PreconditionFailed'
+    assert len(published) == 1
@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta
+
+import boto3
+import pytest
+from botocore.exceptions import ClientError
+from botocore.stub import Stubber
+
+from modelTrainingResponsePublisher import LatestModelResolver
+
+BUCKET = 'sagemaker-us-east-2-583938224360'
+OUTPUT_PREFIX = 'smartcity-waste-management-garbage-level-training-data/output/'
+JOBS = 3000
+PAGE_SIZE = 1000
+
+
+def job_prefixes(count=JOBS):
+    start = datetime(2021, 2, 16, 16, 57, 57)
+    return [
+        '%sgarbage-bin-level-forecaster-%s-%03d/' % (OUTPUT_PREFIX, (start + timedelta(hours=i)).strftime('%Y-%m-%d-%H-%M-%S'), i % 1000)
+        for i in range(count)
+    ]
+
+
+def model_key(job_prefix):
+    return job_prefix + 'output/model.tar.gz'
+
+
+@pytest.fixture
+def s3():
+    client = boto3.client('s3', region_name='us-east-2', aws_access_key_id='test', aws_secret_access_key='test')
+    with Stubber(client) as stubber:
+        yield client, stubber
+        stubber.assert_no_pending_responses()
+
+
+def make_resolver(client):
+    return LatestModelResolver(bucket=BUCKET, output_prefix=OUTPUT_PREFIX, strategy='s3', ttl=60, s3_client=client)
+
+
+def add_listing(stubber, prefixes):
+    pages = [prefixes[i:i + PAGE_SIZE] for i in range(0, len(prefixes), PAGE_SIZE)]
+    for n, page in enumerate(pages):
+        params = {'Bucket': BUCKET, 'Prefix': OUTPUT_PREFIX, 'Delimiter': '/'}
+        if n:
+            params['ContinuationToken'] = 'token-%d' % n
+        response = {'CommonPrefixes': [{'Prefix': p} for p in page], 'IsTruncated': n < len(pages) - 1}
+        if n < len(pages) - 1:
+            response['NextContinuationToken'] = 'token-%d' % (n + 1)
+        stubber.add_response('list_objects_v2', response, params)
+
+
+def add_model(stubber, job_prefix):
+    stubber.add_response('head_object', {'ContentLength': 1024, 'ETag': '"etag"'},
+                         {'Bucket': BUCKET, 'Key': model_key(job_prefix)})
+
+
+def add_head_error(stubber, job_prefix, code, status):
+    stubber.add_client_error('head_object', service_error_code=code, http_status_code=status,
+                             expected_params={'Bucket': BUCKET, 'Key': model_key(job_prefix)})
+
+
+@pytest.mark.parametrize('code', ['404', 'NoSuchKey', 'NotFound'])
+def test_newest_job_with_a_model_is_resolved_across_pages(s3, code):
+    client, stubber = s3
+    prefixes = job_prefixes()
+    add_listing(stubber, prefixes)
+    # The two newest jobs are still running or failed, and have no model
+    add_head_error(stubber, prefixes[-1], code, 404)
+    add_head_error(stubber, prefixes[-2], code, 404)
+    add_model(stubber, prefixes[-3])
+
+    resolver = make_resolver(client)
+    assert resolver.resolve() == prefixes[-3] + 'output'
+    # Warm invocations are answered from the cache, any call would find no stubbed response
+    assert resolver.resolve() == prefixes[-3] + 'output'
+
+
+def test_no_model_in_any_job_resolves_to_none(s3):
+    client, stubber = s3
+    prefixes = job_prefixes(50)
+    add_listing(stubber, prefixes)
+    for job_prefix in reversed(prefixes):
+        add_head_error(stubber, job_prefix, '404', 404)
+
+    assert make_resolver(client).resolve() is None
+
+
+@pytest.mark.parametrize('code, status', [
+    ('SlowDown', 503),
+    ('Throttling', 400),
+    ('AccessDenied', 403),
+    ('InternalError', 500),
+])
+def test_head_errors_other_than_a_missing_model_are_raised(s3, code, status):
+    client, stubber = s3
+    prefixes = job_prefixes()
+    add_listing(stubber, prefixes)
+    add_head_error(stubber, prefixes[-1], code, status)
+
+    resolver = make_resolver(client)
+    with pytest.raises(ClientError) as e:
+        resolver.resolve()
+    assert e.value.response['Error']['Code'] == code
+
+    # Nothing was cached, the next invocation resolves again
+    add_listing(stubber, prefixes)
+    add_model(stubber, prefixes[-1])
+    assert resolver.resolve() == prefixes[-1] + 'output'
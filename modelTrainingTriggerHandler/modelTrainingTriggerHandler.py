@@ -1,6 +1,11 @@
 import os
 import json
+import time
+import random
+import logging
+import threading
 import boto3
+from concurrent.futures import ThreadPoolExecutor
 
 CONTAINERS = {
     'us-west-1': '632365934929.dkr.ecr.us-west-1.amazonaws.com/forecasting-deepar:latest',
@@ -16,6 +21,22 @@ SAGEMAKER_ROLE = os.environ['SAGEMAKER_ROLE']
 
 sagemaker = boto3.client('sagemaker')
 
+TRAINING_INSTANCE_TYPE = os.environ.get('TRAINING_INSTANCE_TYPE', 'ml.c4.2xlarge')
+
+# Training jobs allowed to run at once in the account, including the ones already running
+MAX_IN_FLIGHT_JOBS = int(os.environ.get('MAX_IN_FLIGHT_JOBS', 20))
+# create_training_job calls per second across all submission threads
+SUBMIT_RATE = float(os.environ.get('SUBMIT_RATE', 1))
+SUBMIT_WORKERS = int(os.environ.get('SUBMIT_WORKERS', 4))
+# Every call is made at least once, whatever the setting
+SUBMIT_MAX_ATTEMPTS = max(1, int(os.environ.get('SUBMIT_MAX_ATTEMPTS', 6)))
+SUBMIT_BASE_DELAY = float(os.environ.get('SUBMIT_BASE_DELAY', 0.5))
+SUBMIT_MAX_DELAY = float(os.environ.get('SUBMIT_MAX_DELAY', 20))
+# Retries are not started when less than this is left of the invocation
+DEADLINE_MARGIN = float(os.environ.get('DEADLINE_MARGIN', 5))
+
+THROTTLING_ERRORS = {'ThrottlingException', 'Throttling', 'TooManyRequestsException', 'RequestLimitExceeded'}
+
 def ensure_session(session=None):
     """If session is None, create a default session and return it. Otherwise return the session passed in"""
     if session is None:
@@ -23,51 +44,178 @@ def ensure_session(session=None):
     return session
 
 
+def training_job_request(spec):
+    """Keyword arguments of create_training_job for one job spec"""
+    return dict(
+        TrainingJobName=spec['training_job_name'],
+        HyperParameters={
+            "time_freq": spec['freq'],
+            "context_length": str(spec['context_length']),
+            "prediction_length": str(spec['prediction_length']),
+            "epochs": "400",
+            "learning_rate": "5E-4",
+            "mini_batch_size": "64",
+            "early_stopping_patience": "40",
+            "num_dynamic_feat": "auto",
+        },
+        AlgorithmSpecification={
+            'TrainingImage': CONTAINERS[REGION],
+            'TrainingInputMode': 'File'
+        },
+        RoleArn=SAGEMAKER_ROLE,
+        InputDataConfig=[
+            {
+                'ChannelName': 'train',
+                'DataSource': {
+                    'S3DataSource': {
+                        'S3DataType': 'ManifestFile',
+                        'S3Uri': 's3://{}-training-data/data'.format(spec['s3_bucket_base_uri']),
+                        'S3DataDistributionType': 'FullyReplicated'
+                    }
+                },
+                'ContentType': 'application/json',
+                'CompressionType': 'None'
+            }
+        ],
+        OutputDataConfig={
+            'S3OutputPath': 's3://{}-training-data/output'.format(spec['s3_bucket_base_uri'])
+        },
+        ResourceConfig={
+            'InstanceType': spec.get('instance_type', TRAINING_INSTANCE_TYPE),
+            'InstanceCount': 1,
+            'VolumeSizeInGB': 50
+        },
+        StoppingCondition={
+            'MaxRuntimeInSeconds': 86400
+        }
+    )
+
+
+def error_code(e):
+    """Error code of a botocore ClientError, None for any other exception"""
+    return getattr(e, 'response', {}).get('Error', {}).get('Code')
+
+
+class RateLimiter:
+    """Spaces calls made from any number of threads at least 1 / rate seconds apart"""
+    def __init__(self, rate, sleep=time.sleep):
+        self.interval = 1.0 / rate if rate > 0 else 0
+        self.sleep = sleep
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            self.sleep(wait)
+
+
+class TrainingJobSubmitter:
+    """
+    Submits many training jobs without tripping SageMaker's limits. Calls go
+    through a thread pool behind a shared RateLimiter, throttled calls are retried
+    with jittered exponential backoff, and no more jobs are started than fit under
+    max_in_flight together with the jobs already running. Jobs that do not fit, or
+    that hit the account's ResourceLimitExceeded, are reported as deferred (429)
+    rather than waited for, since a training job runs far longer than an invocation.
+    """
+    def __init__(self, client=None, max_in_flight=MAX_IN_FLIGHT_JOBS, rate=SUBMIT_RATE, workers=SUBMIT_WORKERS,
+                 max_attempts=SUBMIT_MAX_ATTEMPTS, base_delay=SUBMIT_BASE_DELAY, max_delay=SUBMIT_MAX_DELAY,
+                 sleep=time.sleep):
+        if max_attempts < 1:
+            raise ValueError('max_attempts must be at least 1, got %r' % max_attempts)
+        self.client = client or sagemaker
+        self.max_in_flight = max_in_flight
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+        self.rate_limiter = RateLimiter(rate, sleep)
+
+    def submit(self, specs, context=None):
+        """Submit every job spec and return one result per spec, in the same order"""
+        deadline = None
+        if context is not None:
+            deadline = time.monotonic() + context.get_remaining_time_in_millis() / 1000.0 - DEADLINE_MARGIN
+        # The slots are this call's own, so concurrent submit() calls on one submitter do not share them
+        slots = threading.Semaphore(max(0, self.max_in_flight - self._count_in_flight_jobs(deadline)))
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as executor:
+            return list(executor.map(lambda spec: self._submit_one(spec, deadline, slots), specs))
+
+    def _backoff(self, e, attempt, deadline):
+        """Seconds to wait before retrying a call that failed with e, or None if it is not retried"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        out_of_time = deadline is not None and time.monotonic() + delay > deadline
+        if error_code(e) in THROTTLING_ERRORS and attempt + 1 < self.max_attempts and not out_of_time:
+            return delay
+        return None
+
+    def _count_in_flight_jobs(self, deadline):
+        count = 0
+        kwargs = {'StatusEquals': 'InProgress', 'MaxResults': 100}
+        while True:
+            for attempt in range(self.max_attempts):
+                try:
+                    page = self.client.list_training_jobs(**kwargs)
+                    break
+                except Exception as e:
+                    delay = self._backoff(e, attempt, deadline)
+                    if delay is None:
+                        raise
+                    logging.warning('Throttled listing training jobs in flight, retrying in %.2fs', delay)
+                    self.sleep(delay)
+            count += len(page['TrainingJobSummaries'])
+            if not page.get('NextToken'):
+                return count
+            kwargs['NextToken'] = page['NextToken']
+
+    def _submit_one(self, spec, deadline, slots):
+        if not isinstance(spec, dict):
+            return {'training_job_name': None, 'statusCode': 400, 'body': 'Job spec must be an object, got %s' % type(spec).__name__}
+        name = spec.get('training_job_name')
+        try:
+            request = training_job_request(spec)
+        except KeyError as e:
+            return {'training_job_name': name, 'statusCode': 400, 'body': 'Missing %s' % e}
+        if not slots.acquire(blocking=False):
+            return {'training_job_name': name, 'statusCode': 429, 'body': 'Deferred: %d training jobs in flight' % self.max_in_flight}
+
+        for attempt in range(self.max_attempts):
+            self.rate_limiter.acquire()
+            try:
+                response = self.client.create_training_job(**request)
+            except Exception as e:
+                delay = self._backoff(e, attempt, deadline)
+                if delay is not None:
+                    logging.warning('Throttled submitting %s, retrying in %.2fs', name, delay)
+                    self.sleep(delay)
+                    continue
+                slots.release()
+                code = error_code(e)
+                status = 429 if code in THROTTLING_ERRORS or code == 'ResourceLimitExceeded' else 500
+                return {'training_job_name': name, 'statusCode': status, 'body': repr(e), 'attempts': attempt + 1}
+            return {'training_job_name': name, 'statusCode': 200, 'body': repr(response), 'attempts': attempt + 1}
+
 def lambda_handler(event, context):
-    try:
-        response = sagemaker.create_training_job(
-            TrainingJobName=event['training_job_name'],
-            HyperParameters={
-                "time_freq": event['freq'],
-                "context_length": str(event['context_length']),
-                "prediction_length": str(event['prediction_length']),
-                "epochs": "400",
-                "learning_rate": "5E-4",
-                "mini_batch_size": "64",
-                "early_stopping_patience": "40",
-                "num_dynamic_feat": "auto",
-            },
-            AlgorithmSpecification={
-                'TrainingImage': CONTAINERS[REGION],
-                'TrainingInputMode': 'File'
-            },
-            RoleArn=SAGEMAKER_ROLE,
-            InputDataConfig=[
-                {
-                    'ChannelName': 'train',
-                    'DataSource': {
-                        'S3DataSource': {
-                            'S3DataType': 'ManifestFile',
-                            'S3Uri': f's3://{}-training-data/data'.format(event['s3_bucket_base_uri']),
-                            'S3DataDistributionType': 'FullyReplicated'
-                        }
-                    },
-                    'ContentType': 'application/json',
-                    'CompressionType': 'None'
-                }
-            ],
-            OutputDataConfig={
-                'S3OutputPath': f's3://{}-training-data/output'.format(event['s3_bucket_base_uri'])
-            },
-            ResourceConfig={
-                'InstanceType': 'ml.c4.2xlarge',
-                'InstanceCount': 1,
-                'VolumeSizeInGB': 50
-            },
-            StoppingCondition={
-                'MaxRuntimeInSeconds': 86400
+    if 'jobs' in event:
+        try:
+            results = TrainingJobSubmitter().submit(event['jobs'], context)
+        except Exception as e:
+            return {
+                'statusCode': 500,
+                'body': repr(e),
             }
-        )
+        return {
+            'statusCode': 200 if all(r['statusCode'] == 200 for r in results) else 207,
+            'body': json.dumps(results),
+        }
+
+    try:
+        response = sagemaker.create_training_job(**training_job_request(event))
         
     except Exception as e:
         return {
@@ -78,4 +226,4 @@ def lambda_handler(event, context):
         return {
             'statusCode': 200,
             'body': repr(response),
-        }
+        }
\ No newline at end of file
@@ -0,0 +1,10 @@
+import os
+import sys
+
+# The handler reads its role and region on import, and builds its boto3 client, which needs no credentials
+os.environ.setdefault('SAGEMAKER_ROLE', 'arn:aws:iam::583938224360:role/service-role/SageMakerRole')
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-2')
+# Submissions made through lambda_handler are not held back by the default of one per second
+os.environ.setdefault('SUBMIT_RATE', '1000')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
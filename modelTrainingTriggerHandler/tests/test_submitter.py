@@ -0,0 +1,184 @@
+import json
+import threading
+
+import pytest
+from botocore.exceptions import ClientError
+
+import modelTrainingTriggerHandler as handler
+from modelTrainingTriggerHandler import RateLimiter, TrainingJobSubmitter
+
+
+def client_error(code, operation='CreateTrainingJob'):
+    return ClientError({'Error': {'Code': code, 'Message': code}}, operation)
+
+
+class FakeSageMaker:
+    """
+    SageMaker client with running jobs already in progress. create_training_job
+    and list_training_jobs raise the errors queued for them, in order, then succeed.
+    """
+    def __init__(self, running=0, create_errors=(), list_errors=()):
+        self.running = running
+        self.create_errors = list(create_errors)
+        self.list_errors = list(list_errors)
+        self.created = []
+        self.create_calls = 0
+        self.list_calls = 0
+        self._lock = threading.Lock()
+
+    def list_training_jobs(self, **kwargs):
+        assert kwargs['StatusEquals'] == 'InProgress'
+        self.list_calls += 1
+        if self.list_errors:
+            raise client_error(self.list_errors.pop(0), 'ListTrainingJobs')
+        start = int(kwargs.get('NextToken', 0))
+        end = min(self.running, start + kwargs['MaxResults'])
+        page = {'TrainingJobSummaries': [{'TrainingJobName': 'running-%d' % i} for i in range(start, end)]}
+        if end < self.running:
+            page['NextToken'] = str(end)
+        return page
+
+    def create_training_job(self, **kwargs):
+        with self._lock:
+            self.create_calls += 1
+            error = self.create_errors.pop(0) if self.create_errors else None
+            if error is None:
+                self.created.append(kwargs['TrainingJobName'])
+        if error is not None:
+            raise client_error(error)
+        return {'TrainingJobArn': 'arn:aws:sagemaker:us-east-2:583938224360:training-job/' + kwargs['TrainingJobName']}
+
+
+def spec(name):
+    return {'training_job_name': name, 'freq': 'H', 'context_length': 24, 'prediction_length': 24,
+            's3_bucket_base_uri': 'smartcity-waste-management-garbage-level'}
+
+
+def make_submitter(client, **kwargs):
+    sleeps = []
+    kwargs.setdefault('rate', 0)
+    kwargs.setdefault('workers', 1)
+    submitter = TrainingJobSubmitter(client=client, sleep=sleeps.append, **kwargs)
+    return submitter, sleeps
+
+
+class Context:
+    def __init__(self, remaining_seconds):
+        self.remaining_seconds = remaining_seconds
+
+    def get_remaining_time_in_millis(self):
+        return int(self.remaining_seconds * 1000)
+
+
+def test_throttled_submission_is_retried_with_backoff():
+    client = FakeSageMaker(create_errors=['ThrottlingException', 'TooManyRequestsException'])
+    submitter, sleeps = make_submitter(client, base_delay=1, max_delay=3)
+
+    [result] = submitter.submit([spec('job')])
+    assert (result['statusCode'], result['attempts']) == (200, 3)
+    assert client.created == ['job']
+    # Jittered delays stay under the exponential bound of each attempt
+    assert len(sleeps) == 2 and 0 <= sleeps[0] <= 1 and 0 <= sleeps[1] <= 2
+
+
+def test_submission_stops_when_attempts_run_out():
+    client = FakeSageMaker(create_errors=['ThrottlingException'] * 10)
+    submitter, sleeps = make_submitter(client, max_attempts=3, base_delay=0.01)
+
+    [result] = submitter.submit([spec('job')])
+    assert (result['statusCode'], result['attempts']) == (429, 3)
+    assert client.create_calls == 3 and len(sleeps) == 2
+
+
+@pytest.mark.parametrize('code, status', [('ValidationException', 500), ('ResourceLimitExceeded', 429)])
+def test_errors_other_than_throttling_are_not_retried(code, status):
+    client = FakeSageMaker(create_errors=[code])
+    submitter, sleeps = make_submitter(client)
+
+    [result] = submitter.submit([spec('job')])
+    assert (result['statusCode'], result['attempts']) == (status, 1)
+    assert sleeps == []
+
+
+def test_no_retry_is_started_past_the_deadline():
+    client = FakeSageMaker(create_errors=['ThrottlingException'])
+    submitter, sleeps = make_submitter(client, base_delay=10, max_delay=10)
+
+    [result] = submitter.submit([spec('job')], Context(handler.DEADLINE_MARGIN))
+    assert (result['statusCode'], result['attempts']) == (429, 1)
+    assert sleeps == []
+
+
+def test_jobs_beyond_the_in_flight_cap_are_deferred():
+    client = FakeSageMaker(running=118)
+    submitter, _ = make_submitter(client, max_in_flight=120, workers=4)
+
+    results = submitter.submit([spec('job-%d' % i) for i in range(5)])
+    assert sorted(result['statusCode'] for result in results) == [200, 200, 429, 429, 429]
+    assert len(client.created) == 2
+    # The 118 running jobs were counted over two pages
+    assert client.list_calls == 2
+
+
+def test_failed_submission_gives_its_slot_back():
+    client = FakeSageMaker(running=19, create_errors=['ValidationException'])
+    submitter, _ = make_submitter(client, max_in_flight=20)
+
+    results = submitter.submit([spec('bad'), spec('good')])
+    assert [result['statusCode'] for result in results] == [500, 200]
+
+
+def test_invalid_specs_fail_on_their_own():
+    client = FakeSageMaker()
+    submitter, _ = make_submitter(client)
+
+    results = submitter.submit([spec('job'), 'job', None, {'training_job_name': 'incomplete'}])
+    assert [result['statusCode'] for result in results] == [200, 400, 400, 400]
+    assert client.created == ['job']
+
+
+def test_throttled_listing_of_jobs_in_flight_is_retried():
+    client = FakeSageMaker(running=3, list_errors=['ThrottlingException', 'Throttling'])
+    submitter, sleeps = make_submitter(client, max_in_flight=4, base_delay=0.01)
+
+    results = submitter.submit([spec('a'), spec('b')])
+    assert [result['statusCode'] for result in results] == [200, 429]
+    assert client.list_calls == 3 and len(sleeps) == 2
+
+
+def test_listing_errors_other_than_throttling_are_raised():
+    client = FakeSageMaker(list_errors=['AccessDeniedException'])
+    submitter, sleeps = make_submitter(client)
+
+    with pytest.raises(ClientError):
+        submitter.submit([spec('job')])
+    assert client.create_calls == 0 and sleeps == []
+
+
+def test_max_attempts_below_one_is_rejected():
+    with pytest.raises(ValueError):
+        TrainingJobSubmitter(client=FakeSageMaker(), max_attempts=0)
+
+
+def test_rate_limiter_spaces_calls():
+    sleeps = []
+    limiter = RateLimiter(10, sleep=sleeps.append)
+    for _ in range(4):
+        limiter.acquire()
+    # The sleeps are not real, so every call waits for the ones before it
+    assert len(sleeps) == 3
+    for expected, waited in zip([0.1, 0.2, 0.3], sleeps):
+        assert expected - 0.01 < waited <= expected
+
+
+def test_handler_reports_partial_success(monkeypatch):
+    client = FakeSageMaker(create_errors=['ValidationException'])
+    monkeypatch.setattr(handler, 'sagemaker', client)
+
+    response = handler.lambda_handler({'jobs': [spec('bad')]}, Context(60))
+    assert response['statusCode'] == 207
+    assert [result['statusCode'] for result in json.loads(response['body'])] == [500]
+
+    response = handler.lambda_handler({'jobs': [spec('a'), spec('b')]}, Context(60))
+    assert response['statusCode'] == 200
+    assert sorted(client.created) == ['a', 'b']